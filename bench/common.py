@@ -0,0 +1,131 @@
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import typing as t
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+
+def use_side(side: str):
+    """Make the modules of one side importable like its entry point does.
+
+    The api and the app both have a top level cfg module, so a process may only use one side.
+
+    @param side: api or app.
+    """
+    os.environ.setdefault('CAR_CLIENT_ID', 'bench')
+    sys.path.insert(0, os.path.join(SRC, side))
+    sys.path.append(SRC)
+
+
+def percentile(sorted_values: t.List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def summarize(latencies: t.List[float], elapsed: float, items: int = 1) -> dict:
+    """Summarize the latencies in seconds of a benchmark case.
+
+    @param elapsed: The wall time of all iterations in seconds.
+    @param items: The number of items, e.g. scenarios, processed per iteration.
+    """
+    latencies = sorted(latencies)
+    return {
+        "iterations": len(latencies),
+        "throughput": len(latencies) * items / elapsed if elapsed > 0 else float('inf'),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def measure(fn: t.Callable[[int], t.Any], iterations: int, warmup: int = 3, items: int = 1) -> dict:
+    """Measure a function called with the iteration index.
+
+    The latencies are measured without tracing, the peak memory in a separate short run
+    with tracemalloc, as tracing slows down allocations considerably.
+    """
+    for index in range(warmup):
+        fn(index)
+    latencies = []
+    start = time.perf_counter()
+    for index in range(iterations):
+        begin = time.perf_counter()
+        fn(index)
+        latencies.append(time.perf_counter() - begin)
+    result = summarize(latencies, time.perf_counter() - start, items)
+
+    tracemalloc.start()
+    for index in range(min(iterations, 5)):
+        fn(index)
+    result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+
+async def measure_async(fn: t.Callable[[int], t.Awaitable], iterations: int, warmup: int = 3, items: int = 1) -> dict:
+    """Like measure, for a coroutine function."""
+    for index in range(warmup):
+        await fn(index)
+    latencies = []
+    start = time.perf_counter()
+    for index in range(iterations):
+        begin = time.perf_counter()
+        await fn(index)
+        latencies.append(time.perf_counter() - begin)
+    result = summarize(latencies, time.perf_counter() - start, items)
+
+    tracemalloc.start()
+    for index in range(min(iterations, 5)):
+        await fn(index)
+    result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+
+def environment() -> dict:
+    import numpy
+    return {
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> t.List[str]:
+    """Compare results against a baseline.
+
+    @param threshold: The tolerated relative slowdown, e.g. 0.1 for 10 percent.
+    @return: A description of every case which regressed by more than the threshold.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current["p50_ms"] is None or previous["p50_ms"] is None:
+            # a case without any completed iteration has no latencies
+            if current["p50_ms"] is None and previous["p50_ms"] is not None:
+                regressions.append(f"{name}: no iteration completed")
+        elif current["p50_ms"] > previous["p50_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p50 {previous['p50_ms']:.3f} ms -> {current['p50_ms']:.3f} ms")
+        if current["throughput"] < previous["throughput"] / (1 + threshold):
+            regressions.append(f"{name}: throughput {previous['throughput']:.1f}/s -> {current['throughput']:.1f}/s")
+    return regressions
+
+
+def write_json(path: str, content: dict):
+    with open(path, 'w') as file:
+        json.dump(content, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def read_json(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Replay the slider drags of simulated users against a local api and sweep the number of users.
+
+The api is started from src/api/server.py on a free local port, configured by the environment
+like in production, e.g. WORKERS or COMPUTE_WORKERS. Every user drags the inputs of the
+prediction page across the ranges and steps of layout(), each change requests the prediction
+and the crossovers at once, as the graph of the app does, and a user showing the uncertainty
+also requests the monte carlo bands. The results are written as JSON and may be compared
+against a saved baseline:
+
+    python bench/load.py --users 1,4,16,64,256 --output load.json
+    python bench/load.py --baseline load.json --threshold 0.1
+
+The load generator and the api share the cores of the machine, so the saturation point is
+a lower bound of the capacity of a dedicated server.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import typing as t
+
+import httpx
+
+import common
+
+sys.path.append(common.SRC)
+from core.prediction.model import PredictionParameters
+
+# the media type of the binary frames requested by the app, see core.prediction.frame
+FRAME_MEDIA_TYPE = 'application/vnd.car-roi.f64'
+# the prefixes of the ids of the inputs of the graph, followed by the name of the parameter
+INPUT_PREFIXES = ('slider_', 'input_', 'dropdown_')
+# the relative chance of a user to change an input of a kind, sliders are dragged the most
+KIND_WEIGHTS = {'slider': 4, 'input': 1, 'dropdown': 0.25}
+
+def describe_inputs() -> dict:
+    """Describe the inputs of the prediction page, run in its own process as it imports the app.
+
+    @return: The names of the parameters mapped to their kind, their ascending values and their
+        initial value, and the settings of the app shaping its requests.
+    """
+    os.environ['BACKEND'] = 'local'
+    common.use_side('app')
+    import cfg
+    cfg.load()
+    from layouts.prediction import layout
+
+    inputs = {}
+    for component in layout.layout()._traverse():
+        component_id = getattr(component, 'id', None)
+        prefix = next((prefix for prefix in INPUT_PREFIXES if isinstance(component_id, str) and component_id.startswith(prefix)), None)
+        if prefix is None:
+            continue
+        if prefix == 'dropdown_':
+            values = sorted(option['value'] for option in component.options)
+        else:
+            values = list(range(component.min, component.max + 1, component.step))
+        inputs[component_id[len(prefix):]] = {
+            "kind": prefix[:-1],
+            "values": values,
+            "value": component.value,
+        }
+    return {"inputs": inputs, "max_points": cfg.graph_max_points, "monte_carlo_paths": cfg.monte_carlo_paths}
+
+
+def app_inputs() -> dict:
+    """The inputs of the prediction page, described in a new process."""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--describe-inputs'],
+        check=True,
+        stdout=subprocess.PIPE,
+    )
+    return json.loads(output.stdout)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int) -> subprocess.Popen:
+    """Start the api on a local port, it is ready once it accepts connections."""
+    env = dict(os.environ, API_ENDPOINT=f"http://127.0.0.1:{port}", DEBUG='')
+    process = subprocess.Popen([sys.executable, os.path.join(common.SRC, 'api', 'server.py')], env=env)
+    deadline = time.monotonic() + 60
+    while True:
+        assert process.poll() is None, f"The api exited with status {process.returncode}"
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process
+        except OSError:
+            assert time.monotonic() < deadline, "The api did not start within 60 seconds"
+            time.sleep(0.1)
+
+
+def stop_server(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+class Level:
+    """The outcome of the updates of one number of users within the measured window.
+        - latencies: The seconds from a change to the last response of its update.
+        - statuses: The number of responses per status, or timeout and error without a response.
+        - superseded: The number of changes skipped, as a newer change of the drag was due.
+        - sent: The number of updates sent, including the ones completing after the window.
+    """
+    def __init__(self):
+        self.sent = 0
+        self.latencies: t.List[float] = []
+        self.statuses: t.Dict[str, int] = {}
+        self.superseded = 0
+
+    def count(self, status: str):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+def valid(params: dict) -> bool:
+    """Whether the api computes a prediction of parameters, the app also offers values it rejects."""
+    try:
+        PredictionParameters(**params).ensure_valid()
+    except AssertionError:
+        return False
+    # a used car must be younger than the age at which it is replaced
+    return params['purchase_used_age'] < params['purchase_years']
+
+
+class User:
+    """A simulated user of the prediction page, who drags its inputs one after another.
+
+    A slider is dragged step by step to a random value, emitting a change every interval. A
+    change due while the update of a previous one is in flight supersedes the changes before
+    it, like the latest-wins updates of the app. A number input or a dropdown changes at once.
+    Only valid parameters are sent, so the errors of a sweep are caused by the load.
+    """
+    def __init__(self, inputs: dict, rng: random.Random, uncertainty: bool):
+        self.inputs = inputs
+        self.rng = rng
+        self.uncertainty = uncertainty
+        self.params = {name: spec['value'] for name, spec in inputs.items()}
+        self.names = list(inputs)
+        self.weights = [KIND_WEIGHTS[inputs[name]['kind']] for name in self.names]
+
+    def drag(self, max_steps: int) -> t.List[t.Tuple[str, t.Any]]:
+        """The changes of the next drag of an input, as (name, value)."""
+        name = self.rng.choices(self.names, self.weights)[0]
+        spec = self.inputs[name]
+        values = spec['values']
+        current = values.index(self.params[name]) if self.params[name] in values else 0
+        # the rules of the parameters bound each input to a range, so a drag within it stays valid
+        targets = [index for index, value in enumerate(values) if valid({**self.params, name: value})]
+        if not targets:
+            return []
+        target = self.rng.choice(targets)
+        if spec['kind'] != 'slider' or target == current:
+            return [(name, values[target])]
+        direction = 1 if target > current else -1
+        target = current + direction * min(abs(target - current), max_steps)
+        return [(name, values[index]) for index in range(current + direction, target + direction, direction)]
+
+
+async def update(client, user: User, max_points: int, paths: int) -> str:
+    """Request the graph data of a change like the app, returns the worst status of its responses."""
+    params = dict(user.params)
+    requests = [
+        client.get('/prediction', params={**params, "max_points": max_points}, headers={"Accept": FRAME_MEDIA_TYPE}),
+        client.get('/prediction/breakeven', params=params),
+    ]
+    if user.uncertainty:
+        # the bands are requested at most at monthly resolution
+        bands = dict(params, points_per_year=min(params['points_per_year'], 12))
+        requests.append(client.post('/prediction/montecarlo', json={"parameters": bands, "paths": paths}))
+    statuses = []
+    for response in await asyncio.gather(*requests, return_exceptions=True):
+        if isinstance(response, Exception):
+            statuses.append('timeout' if isinstance(response, httpx.TimeoutException) else 'error')
+        else:
+            statuses.append(str(response.status_code))
+    # a failed request fails the update, the first failure is reported
+    return next((status for status in statuses if status != '200'), '200')
+
+
+async def run_level(base_url: str, token: str, described: dict, users: int, args) -> Level:
+    """Run a number of users concurrently and record the updates within the measured window."""
+    level = Level()
+    start = time.perf_counter()
+    measured = start + args.warmup
+    stop = measured + args.duration
+
+    async def session(index: int):
+        rng = random.Random(args.seed * 1000003 + index)
+        user = User(described['inputs'], rng, rng.random() < args.uncertainty)
+        # the users do not start at once, like the pages of a real audience
+        await asyncio.sleep(rng.uniform(0, min(args.warmup, args.think)))
+        while time.perf_counter() < stop:
+            changes = user.drag(args.max_drag_steps)
+            begin = time.perf_counter()
+            due = 0
+            while due < len(changes) and time.perf_counter() < stop:
+                # only the latest change due is sent, the ones it supersedes are skipped
+                latest = min(len(changes) - 1, max(due, int((time.perf_counter() - begin) / args.drag_interval)))
+                if time.perf_counter() >= measured:
+                    level.superseded += latest - due
+                for name, value in changes[due:latest + 1]:
+                    user.params[name] = value
+                sent = time.perf_counter()
+                if sent >= measured:
+                    level.sent += 1
+                status = await update(client, user, described['max_points'], described['monte_carlo_paths'])
+                done = time.perf_counter()
+                if sent >= measured and done <= stop:
+                    level.latencies.append(done - sent)
+                    level.count(status)
+                due = latest + 1
+                if due < len(changes):
+                    await asyncio.sleep(max(0.0, begin + due * args.drag_interval - time.perf_counter()))
+            await asyncio.sleep(rng.expovariate(1 / args.think))
+
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=args.timeout,
+        # every user has its own connections for the requests of an update, like the app it stands for
+        limits=httpx.Limits(max_connections=3 * users, max_keepalive_connections=3 * users),
+    ) as client:
+        await asyncio.gather(*(session(index) for index in range(users)))
+    return level
+
+
+def summarize_level(level: Level, duration: float, users: int) -> dict:
+    """Summarize a level like a benchmark case, with the updates as iterations.
+
+    The latencies are None if no update completed within the window, which is a total
+    failure unless none was sent.
+    """
+    if level.latencies:
+        result = common.summarize(level.latencies, duration)
+        result["max_ms"] = max(level.latencies) * 1000
+    else:
+        result = {"iterations": 0, "throughput": 0.0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    # the users only send valid parameters, so any other status than 200 is an error
+    failed = sum(count for status, count in level.statuses.items() if status != '200')
+    result.update({
+        "users": users,
+        "sent": level.sent,
+        "failed": failed,
+        "error_rate": failed / len(level.latencies) if level.latencies else float(level.sent > 0),
+        "superseded": level.superseded,
+        "statuses": level.statuses,
+    })
+    return result
+
+
+def saturation(results: t.List[dict], min_gain: float, max_error_rate: float) -> dict:
+    """Find the number of users at which the api saturates.
+
+    The api is saturated at the first level whose throughput gains less than min_gain over
+    the best level before, or whose error rate exceeds max_error_rate. The level before is the
+    largest sustained one.
+    """
+    best = None
+    saturated = None
+    for result in results:
+        if result["error_rate"] > max_error_rate or (
+            best is not None and result["throughput"] < best["throughput"] * (1 + min_gain)
+        ):
+            saturated = result["users"]
+            break
+        best = result
+    return {
+        # None if the api did not saturate within the sweep
+        "users": saturated,
+        "sustained_users": best["users"] if best is not None else None,
+        "sustained_throughput": best["throughput"] if best is not None else 0.0,
+        "sustained_p95_ms": best["p95_ms"] if best is not None else None,
+    }
+
+
+def milliseconds(value: t.Optional[float]) -> str:
+    return '-' if value is None else f"{value:.1f}"
+
+
+def report(results: t.List[dict], saturated: dict):
+    print(f"{'users':>6} {'updates/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10} {'errors':>8}", file=sys.stderr)
+    for result in results:
+        print(
+            f"{result['users']:>6} {result['throughput']:>10.1f} {milliseconds(result['p50_ms']):>10} {milliseconds(result['p95_ms']):>10} "
+            f"{milliseconds(result['p99_ms']):>10} {milliseconds(result['max_ms']):>10} {result['error_rate']:>8.2%}",
+            file=sys.stderr,
+        )
+    if saturated["users"] is None:
+        print(f"not saturated, {saturated['sustained_throughput']:.1f} updates/s with {saturated['sustained_users']} users", file=sys.stderr)
+    else:
+        print(
+            f"saturated at {saturated['users']} users, sustained {saturated['sustained_throughput']:.1f} updates/s "
+            f"with {saturated['sustained_users']} users",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', default='1,4,16,64,256', help="The comma separated numbers of concurrent users, ascending.")
+    parser.add_argument('--duration', type=float, default=10.0, help="The measured seconds of each number of users.")
+    parser.add_argument('--warmup', type=float, default=2.0, help="The seconds before each measurement.")
+    parser.add_argument('--drag-interval', type=float, default=0.05, help="The seconds between the changes of a slider drag.")
+    parser.add_argument('--max-drag-steps', type=int, default=20, help="The maximum number of steps of a slider drag.")
+    parser.add_argument('--think', type=float, default=1.0, help="The mean seconds between the drags of a user.")
+    parser.add_argument('--uncertainty', type=float, default=0.1, help="The share of users showing the uncertainty bands.")
+    parser.add_argument('--timeout', type=float, default=10.0, help="The seconds after which a request fails.")
+    parser.add_argument('--min-gain', type=float, default=0.1, help="The relative throughput gain below which the api is saturated.")
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help="The error rate above which the api is saturated.")
+    parser.add_argument('--seed', type=int, default=0, help="The seed of the simulated users.")
+    parser.add_argument('--output', help="The file the results are written to.")
+    parser.add_argument('--baseline', help="The file of saved results to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.1, help="The tolerated relative slowdown.")
+    parser.add_argument('--describe-inputs', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.describe_inputs:
+        json.dump(describe_inputs(), sys.stdout)
+        return
+
+    levels = [int(users) for users in args.users.split(',') if users.strip()]
+    assert levels and all(users > 0 for users in levels), "The numbers of users must be greater than 0"
+    assert levels == sorted(levels), "The numbers of users must be ascending"
+    assert args.drag_interval > 0 and args.think > 0, "The drag interval and think time must be greater than 0"
+
+    described = app_inputs()
+    os.environ.setdefault('CAR_CLIENT_ID', 'bench')
+    token = base64.b64encode(os.environ['CAR_CLIENT_ID'].encode('utf-8')).decode('ascii')
+    port = free_port()
+    process = start_server(port)
+    results = []
+    try:
+        for users in levels:
+            level = asyncio.run(run_level(f"http://127.0.0.1:{port}", token, described, users, args))
+            results.append(summarize_level(level, args.duration, users))
+            print(f"{users} users: {results[-1]['throughput']:.1f} updates/s", file=sys.stderr)
+    finally:
+        stop_server(process)
+
+    saturated = saturation(results, args.min_gain, args.max_error_rate)
+    report(results, saturated)
+    cases = {f"load.users.{result['users']}": result for result in results}
+    if args.output:
+        common.write_json(args.output, {
+            "environment": common.environment(),
+            "settings": {name: value for name, value in vars(args).items() if name not in ('output', 'baseline', 'describe_inputs')},
+            "inputs": described,
+            "results": cases,
+            "saturation": saturated,
+        })
+    if args.baseline:
+        regressions = common.compare(cases, common.read_json(args.baseline)["results"], args.threshold)
+        for regression in regressions:
+            print(f"regression {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
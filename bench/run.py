@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Offline benchmarks of the cost engine, the api and the graph of the app.
+
+Every layer runs in its own process, because the api and the app both have a top level cfg
+module. The results are written as JSON and may be compared against a saved baseline:
+
+    python bench/run.py --output results.json
+    python bench/run.py --baseline results.json --threshold 0.1
+
+The process exits with status 1 if any case regressed by more than the threshold.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import subprocess
+import sys
+
+import common
+
+LAYERS = ('engine', 'api', 'graph', 'startup')
+# the time axes of the horizon sizes, as (horizon_years, points_per_year)
+HORIZONS = {
+    'default': (30, 2),
+    'monthly': (50, 12),
+    'daily': (50, 365),
+}
+
+def random_parameters(rng: random.Random, horizon_years: int = 30, points_per_year: int = 2) -> dict:
+    """Draw valid parameters from the ranges the app offers."""
+    purchase_years = rng.randint(5, 20)
+    return {
+        "purchase_years": purchase_years,
+        "purchase_new_price": rng.randint(10000, 120000),
+        "purchase_used_price": rng.randint(10000, 60000),
+        # the age of a used car must differ from the years it is kept
+        "purchase_used_age": rng.choice([age for age in range(0, 11) if age != purchase_years]),
+        "leasing_cost_per_month": rng.randint(100, 5000),
+        "leasing_switch_cost": rng.randint(1, 10000),
+        "leasing_years": rng.randint(1, 6),
+        "repair_cost_per_year": rng.randint(0, 10000),
+        "repair_free_years": rng.randint(0, 10),
+        "horizon_years": horizon_years,
+        "points_per_year": points_per_year,
+    }
+
+
+def corpus(size: int, seed: int, horizon_years: int = 30, points_per_year: int = 2) -> list:
+    rng = random.Random(seed)
+    return [random_parameters(rng, horizon_years, points_per_year) for _ in range(size)]
+
+
+def bench_engine(scale: float) -> dict:
+    common.use_side('api')
+    from core.prediction.model import PredictionParameters
+    from core.prediction import service
+    from cache import LruCache
+
+    results = {}
+    for name, (horizon_years, points_per_year) in HORIZONS.items():
+        rows = corpus(256, 1, horizon_years, points_per_year)
+        iterations = max(10, int(2000 * scale / points_per_year))
+        results[f"engine.prediction.{name}"] = common.measure(
+            lambda index: service.create_prediction_arrays(PredictionParameters(**rows[index % len(rows)])),
+            iterations,
+        )
+        results[f"engine.prediction_data_frame.{name}"] = common.measure(
+            lambda index: service.create_prediction_data_frame(PredictionParameters(**rows[index % len(rows)])),
+            max(10, iterations // 4),
+        )
+        # a leasing slider drag, the purchase curves come from the curve cache
+        curve_cache = LruCache(1024)
+        base = rows[0]
+        results[f"engine.prediction_curves.{name}"] = common.measure(
+            lambda index: service.create_prediction_curves(
+                PredictionParameters(**dict(base, leasing_cost_per_month=100 + index)), curve_cache
+            ),
+            iterations,
+        )
+
+    rows = corpus(1000, 2)
+    results["engine.batch.1000"] = common.measure(
+        lambda index: service.create_prediction_batch(service.create_parameter_columns(rows)),
+        max(5, int(50 * scale)),
+        items=len(rows),
+    )
+
+    fixed = corpus(1, 3)[0]
+    ranges = {
+        "purchase_new_price": {"start": 20000, "stop": 80000, "step": 1000},
+        "leasing_cost_per_month": {"start": 200, "stop": 1200, "step": 50},
+    }
+    fixed = {name: value for name, value in fixed.items() if name not in ranges}
+    def sweep(index: int):
+        axes, columns = service.create_parameter_grid(fixed, ranges)
+        return service.create_prediction_sweep(axes, columns)
+    results["engine.sweep.1200"] = common.measure(sweep, max(5, int(50 * scale)), items=1200)
+
+    from core.prediction import optimize
+    rows = corpus(64, 7)
+    fixed = [{name: row[name] for name in optimize.FIXED_FIELDS} for row in rows]
+    results["engine.optimize.default"] = common.measure(
+        lambda index: optimize.optimize(fixed[index % len(fixed)], None, 30),
+        max(10, int(500 * scale)),
+    )
+    # 100 purchase years by 100 used ages by 100 leasing years
+    wide = {name: {"start": 0 if name == 'purchase_used_age' else 1, "stop": 101} for name in optimize.DEFAULT_RANGES}
+    results["engine.optimize.wide"] = common.measure(
+        lambda index: optimize.optimize(fixed[index % len(fixed)], wide, 30),
+        max(5, int(50 * scale)),
+    )
+    return results
+
+
+def bench_api(scale: float) -> dict:
+    common.use_side('api')
+    import httpx
+    import server
+
+    def bearer(token: str) -> str:
+        return f"Bearer {base64.b64encode(token.encode('utf-8')).decode('ascii')}"
+
+    headers = {"Authorization": bearer(os.environ['CAR_CLIENT_ID']), "Origin": "http://127.0.0.1:3001"}
+    rows = corpus(4096, 4)
+    batch = corpus(100, 5)
+
+    async def run() -> dict:
+        results = {}
+        async with httpx.AsyncClient(app=server.app, base_url='http://bench') as client:
+            async def request(method: str, url: str, expected: int, **kwargs):
+                response = await client.request(method, url, **kwargs)
+                assert response.status_code == expected, f"{method} {url}: {response.status_code} {response.text}"
+
+            iterations = max(20, int(1000 * scale))
+            results["api.prediction.cached"] = await common.measure_async(
+                lambda index: request('GET', '/prediction', 200, params=rows[0], headers=headers),
+                iterations,
+            )
+            # distinct parameters miss the cache, unless the corpus is exhausted
+            results["api.prediction.uncached"] = await common.measure_async(
+                lambda index: request('GET', '/prediction', 200, params=rows[(index + 1) % len(rows)], headers=headers),
+                min(iterations, len(rows) - 1),
+                warmup=0,
+            )
+            results["api.prediction.frame"] = await common.measure_async(
+                lambda index: request('GET', '/prediction', 200, params=rows[0],
+                                      headers={**headers, "Accept": "application/vnd.car-roi.f64"}),
+                iterations,
+            )
+            results["api.prediction.invalid_token"] = await common.measure_async(
+                lambda index: request('GET', '/prediction', 400, params=rows[0],
+                                      headers={"Authorization": bearer('invalid')}),
+                iterations,
+            )
+            results["api.prediction.preflight"] = await common.measure_async(
+                lambda index: request('OPTIONS', '/prediction', 200, headers={
+                    "Origin": "http://127.0.0.1:3001",
+                    "Access-Control-Request-Method": "GET",
+                    "Access-Control-Request-Headers": "authorization",
+                }),
+                iterations,
+            )
+            results["api.batch.100"] = await common.measure_async(
+                lambda index: request('POST', '/prediction/batch', 200, json=batch, headers=headers),
+                max(5, int(100 * scale)),
+                items=len(batch),
+            )
+        return results
+
+    return asyncio.run(run())
+
+
+def bench_graph(scale: float) -> dict:
+    os.environ['BACKEND'] = 'local'
+    common.use_side('app')
+    import cfg
+    cfg.load()
+    from layouts.prediction import layout
+    from core.prediction.model import PredictionParameters
+    from dash._utils import to_json
+
+    rows = corpus(256, 6)
+    def update(index: int, points_per_year: int = 2, uncertainty: list = []):
+        params = rows[index % len(rows)]
+        # the initial update of a page, which patches every trace
+        return layout.patch_graph(
+            PredictionParameters(**dict(params, points_per_year=points_per_year)),
+            uncertainty, None, {}, set(),
+        )
+
+    # a leasing slider drag, which only patches the leasing curve and the crossovers
+    base = rows[0]
+    sent = update(0)[1]
+    payloads = []
+    def drag(index: int):
+        params = PredictionParameters(**dict(base, leasing_years=1 + index % 6))
+        patch, _ = layout.patch_graph(params, [], None, sent, {'slider_leasing_years'})
+        payloads.append(len(to_json(patch)))
+
+    iterations = max(10, int(200 * scale))
+    results = {
+        "graph.update.default": common.measure(update, iterations),
+        "graph.update.daily": common.measure(lambda index: update(index, 365), max(5, iterations // 4)),
+        "graph.update.uncertainty": common.measure(lambda index: update(index, 2, ['bands']), max(5, iterations // 4)),
+        "graph.update.leasing_drag": common.measure(drag, iterations),
+    }
+    # the size of the figure updates sent to the browser
+    results["graph.update.default"]["payload_bytes"] = len(to_json(update(0)[0]))
+    results["graph.update.daily"]["payload_bytes"] = len(to_json(update(0, 365)[0]))
+    results["graph.update.leasing_drag"]["payload_bytes"] = max(payloads)
+    return results
+
+
+def bench_startup(scale: float) -> dict:
+    """Measure cold starts of the api, each in a fresh process."""
+    runs = max(3, int(10 * scale))
+    starts = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup.py')],
+            check=True,
+            stdout=subprocess.PIPE,
+        )
+        starts.append(json.loads(output.stdout))
+
+    results = {}
+    for step in ('import', 'first_request', 'warm_up'):
+        latencies = [start[step]["seconds"] for start in starts]
+        result = common.summarize(latencies, sum(latencies))
+        # the resident memory of a worker after the step
+        result["peak_memory_bytes"] = max(start[step]["rss_bytes"] for start in starts)
+        results[f"startup.{step}"] = result
+    return results
+
+
+def run_layer(layer: str, scale: float) -> dict:
+    """Run a layer in a new process and return its results."""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--layer', layer, '--scale', str(scale)],
+        check=True,
+        stdout=subprocess.PIPE,
+    )
+    return json.loads(output.stdout)
+
+
+def report(results: dict):
+    print(f"{'case':<40} {'throughput/s':>14} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'peak MiB':>10}", file=sys.stderr)
+    for name, result in results.items():
+        print(
+            f"{name:<40} {result['throughput']:>14.1f} {result['p50_ms']:>10.3f} {result['p95_ms']:>10.3f} "
+            f"{result['p99_ms']:>10.3f} {result['peak_memory_bytes'] / 2**20:>10.2f}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--layers', default=','.join(LAYERS), help="The comma separated layers to run.")
+    parser.add_argument('--scale', type=float, default=1.0, help="The factor applied to the number of iterations.")
+    parser.add_argument('--output', help="The file the results are written to.")
+    parser.add_argument('--baseline', help="The file of saved results to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.1, help="The tolerated relative slowdown.")
+    parser.add_argument('--layer', choices=LAYERS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.layer:
+        # the process of a single layer writes its results to stdout
+        random.seed(0)
+        results = globals()[f"bench_{args.layer}"](args.scale)
+        json.dump(results, sys.stdout)
+        return
+
+    layers = [layer.strip() for layer in args.layers.split(',') if layer.strip()]
+    unknown = set(layers).difference(LAYERS)
+    assert not unknown, f"Unknown layers: {', '.join(sorted(unknown))}"
+    results = {}
+    for layer in layers:
+        results.update(run_layer(layer, args.scale))
+    report(results)
+
+    if args.output:
+        common.write_json(args.output, {"environment": common.environment(), "scale": args.scale, "results": results})
+    if args.baseline:
+        regressions = common.compare(results, common.read_json(args.baseline)["results"], args.threshold)
+        for regression in regressions:
+            print(f"regression {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Measure a cold start of an api worker, run in a fresh process by the startup layer of run.py.
+
+Writes the duration in seconds and the peak resident memory in bytes after importing the
+server, answering the first prediction and warming up as JSON to stdout.
+"""
+import json
+import os
+import resource
+import sys
+import time
+
+import common
+
+def peak_rss() -> int:
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def main():
+    common.use_side('api')
+    result = {}
+
+    start = time.perf_counter()
+    import server
+    result["import"] = {"seconds": time.perf_counter() - start, "rss_bytes": peak_rss()}
+    assert 'pandas' not in sys.modules, "The api must start without importing pandas"
+
+    import asyncio
+    import base64
+    import httpx
+    from run import corpus
+
+    async def first_request():
+        headers = {"Authorization": f"Bearer {base64.b64encode(os.environ['CAR_CLIENT_ID'].encode('utf-8')).decode('ascii')}"}
+        async with httpx.AsyncClient(app=server.app, base_url='http://bench') as client:
+            start = time.perf_counter()
+            response = await client.get('/prediction', params=corpus(1, 7)[0], headers=headers)
+            assert response.status_code == 200, f"GET /prediction: {response.status_code} {response.text}"
+            return time.perf_counter() - start
+
+    result["first_request"] = {"seconds": asyncio.run(first_request()), "rss_bytes": peak_rss()}
+
+    start = time.perf_counter()
+    server.warm_up()
+    result["warm_up"] = {"seconds": time.perf_counter() - start, "rss_bytes": peak_rss()}
+    json.dump(result, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
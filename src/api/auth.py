@@ -2,22 +2,75 @@ from starlette.authentication import (
     AuthCredentials, AuthenticationBackend, AuthenticationError, SimpleUser
 )
 import base64
+import hashlib
+import typing as t
 
+from cache import LruCache
+from metrics import Stage, Counter, Collected
 import cfg
 
+AUTHENTICATIONS = Counter('car_roi_authentications_total', "The number of authenticated or rejected bearer tokens.", ('result',))
+
+# the bearer tokens mapped to the name of their client, or the error rejecting them
+_token_cache: LruCache = None
+
+def token_cache() -> LruCache:
+    """The decoded bearer tokens, created on first use from the configuration."""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = LruCache(cfg.auth_cache_size)
+    return _token_cache
+
+
+Collected(
+    'car_roi_auth_cache_events_total', 'counter', "The lookups of bearer tokens in the token cache.", ('result',),
+    lambda: {} if _token_cache is None else {('hit',): _token_cache.hits, ('miss',): _token_cache.misses}
+)
+
+
+def resolve_client(token: str) -> t.Tuple[t.Optional[str], t.Optional[str]]:
+    """Resolve a base64 encoded client id to the name of its client, or the reason it is invalid."""
+    try:
+        client_id = base64.b64decode(token).decode('utf-8')
+    except Exception as error:
+        return None, 'Invalid Authorization header'
+    # only the digests of the client ids are configured, so a lookup needs no comparison of secrets
+    name = cfg.client_keys.get(hashlib.sha256(client_id.encode('utf-8')).hexdigest())
+    if name is None:
+        return None, 'Invalid bearer token'
+    return name, None
+
+
 class ClientIdBearerTokenBackend(AuthenticationBackend):
-    async def validate_token(self, token: str) -> bool:
-        return token == cfg.client_id
+    """Authenticate the base64 encoded client id of a bearer token against the configured client keys.
+
+    The user of an authenticated request is named after its client, see cfg.client_keys. The
+    result of a token is cached, so repeated requests of a client neither decode nor hash it.
+    """
+    async def authenticate_token(self, token: str):
+        """Authenticate the base64 encoded client id of a bearer token, e.g. sent in a message instead of a header."""
+        cache = token_cache()
+        resolved = cache.get(token)
+        if resolved is None:
+            resolved = resolve_client(token)
+            cache.put(token, resolved)
+        name, error = resolved
+        if name is None:
+            AUTHENTICATIONS.inc('rejected')
+            raise AuthenticationError(error)
+        AUTHENTICATIONS.inc('authenticated')
+        return AuthCredentials(["authenticated"]), SimpleUser(name)
 
     async def authenticate(self, conn):
-        authorization = conn.headers['Authorization']
-        try:
-            method, token = authorization.split(' ')
+        with Stage(conn.scope, 'auth'):
+            # browsers cannot set headers on websockets, those authenticate with their first message
+            authorization = conn.headers.get('Authorization')
+            if authorization is None:
+                return
+            try:
+                method, token = authorization.split(' ')
+            except Exception as error:
+                raise AuthenticationError('Invalid Authorization header')
             if method != 'Bearer':
                 return
-            token = base64.b64decode(token).decode('utf-8')
-        except Exception as error:
-            raise AuthenticationError('Invalid Authorization header')
-        if not await self.validate_token(token):
-            raise AuthenticationError('Invalid bearer token')
-        return AuthCredentials(["authenticated"]), SimpleUser(token)
+            return await self.authenticate_token(token)
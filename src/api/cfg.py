@@ -1,23 +1,114 @@
+import hashlib
 import os
+import re
 from dotenv import load_dotenv
 
 client_id: str
+client_keys: dict
+auth_cache_size: int
+rate_limit: float
+rate_limit_burst: int
+max_concurrent_requests: int
 debug: bool
 origin: list
 host: str
 port: int
+batch_max_size: int
+batch_max_cells: int
+sweep_max_cells: int
+cache_max_size: int
+cache_ttl: float
+cache_control: str
+curve_cache_max_size: int
+monte_carlo_max_paths: int
+monte_carlo_max_cells: int
+monte_carlo_block_cells: int
+compute_executor: str
+compute_workers: int
+compute_queue_size: int
+compute_retry_after: int
+compute_chunk_cells: int
+workers: int
+loop: str
+http: str
+backlog: int
+keep_alive_timeout: int
+graceful_shutdown_timeout: int
+metrics: bool
+server_timing: bool
+optimize_max_candidates: int
+stream_max_connections: int
+stream_max_message_bytes: int
+stream_idle_timeout: float
+stream_auth_timeout: float
 
 def load():
     global client_id
+    global client_keys
+    global auth_cache_size
+    global rate_limit
+    global rate_limit_burst
+    global max_concurrent_requests
     global debug
     global origin
     global host
     global port
+    global batch_max_size
+    global batch_max_cells
+    global sweep_max_cells
+    global cache_max_size
+    global cache_ttl
+    global cache_control
+    global curve_cache_max_size
+    global monte_carlo_max_paths
+    global monte_carlo_max_cells
+    global monte_carlo_block_cells
+    global compute_executor
+    global compute_workers
+    global compute_queue_size
+    global compute_retry_after
+    global compute_chunk_cells
+    global workers
+    global loop
+    global http
+    global backlog
+    global keep_alive_timeout
+    global graceful_shutdown_timeout
+    global metrics
+    global server_timing
+    global optimize_max_candidates
+    global stream_max_connections
+    global stream_max_message_bytes
+    global stream_idle_timeout
+    global stream_auth_timeout
 
     load_dotenv()
     client_id = os.getenv('CAR_CLIENT_ID')
     assert client_id, "A shared client id between the server and client is required"
 
+    # the sha256 hex digests of the client ids mapped to the names of the clients, the shared
+    # client id of the app is the client default
+    client_keys = {hashlib.sha256(client_id.encode('utf-8')).hexdigest(): 'default'}
+    for entry in filter(None, os.getenv('CLIENT_KEYS', '').split(',')):
+        name, _, digest = entry.strip().partition('=')
+        digest = digest.strip().lower()
+        assert name and re.fullmatch('[0-9a-f]{64}', digest), "The CLIENT_KEYS environment variable must be a comma separated list of name=sha256 hex digest"
+        client_keys[digest] = name
+
+    auth_cache_size = int(os.getenv('AUTH_CACHE_SIZE', 4096))
+    assert auth_cache_size >= 0, "The AUTH_CACHE_SIZE environment variable must be greater than or equal to 0"
+
+    # the requests per second each client may sustain, 0 disables the rate limit
+    rate_limit = float(os.getenv('RATE_LIMIT', 0))
+    assert rate_limit >= 0, "The RATE_LIMIT environment variable must be greater than or equal to 0"
+
+    rate_limit_burst = int(os.getenv('RATE_LIMIT_BURST', 20))
+    assert rate_limit_burst > 0, "The RATE_LIMIT_BURST environment variable must be greater than 0"
+
+    # the requests handled at once by a worker, 0 disables the limit
+    max_concurrent_requests = int(os.getenv('MAX_CONCURRENT_REQUESTS', 1024))
+    assert max_concurrent_requests >= 0, "The MAX_CONCURRENT_REQUESTS environment variable must be greater than or equal to 0"
+
     debug = os.getenv('DEBUG', False)
     debug = True if debug else False
 
@@ -30,3 +121,90 @@ def load():
     port = int(port) if port else None
     assert host, "A host must be specified in the first origin"
     assert port, "A port must be specified in the first origin"
+
+    batch_max_size = int(os.getenv('BATCH_MAX_SIZE', 10000))
+    assert batch_max_size > 0, "The BATCH_MAX_SIZE environment variable must be greater than 0"
+
+    # the parameter sets times the points of a batch
+    batch_max_cells = int(os.getenv('BATCH_MAX_CELLS', 4000000))
+    assert batch_max_cells > 0, "The BATCH_MAX_CELLS environment variable must be greater than 0"
+
+    sweep_max_cells = int(os.getenv('SWEEP_MAX_CELLS', 4000000))
+    assert sweep_max_cells > 0, "The SWEEP_MAX_CELLS environment variable must be greater than 0"
+
+    cache_max_size = int(os.getenv('CACHE_MAX_SIZE', 1024))
+    assert cache_max_size >= 0, "The CACHE_MAX_SIZE environment variable must be greater than or equal to 0"
+
+    cache_ttl = float(os.getenv('CACHE_TTL', 0)) or None
+    assert cache_ttl is None or cache_ttl > 0, "The CACHE_TTL environment variable must be greater than or equal to 0"
+
+    # predictions are a pure function of the request, so clients may keep them indefinitely. They
+    # are only served to authenticated clients, so shared caches must not keep them by default
+    cache_control = os.getenv('CACHE_CONTROL', 'private, max-age=31536000, immutable')
+
+    # the number of cost curves cached, each strategy is cached separately
+    curve_cache_max_size = int(os.getenv('CURVE_CACHE_MAX_SIZE', 3072))
+    assert curve_cache_max_size >= 0, "The CURVE_CACHE_MAX_SIZE environment variable must be greater than or equal to 0"
+
+    monte_carlo_max_paths = int(os.getenv('MONTE_CARLO_MAX_PATHS', 1000000))
+    assert monte_carlo_max_paths > 0, "The MONTE_CARLO_MAX_PATHS environment variable must be greater than 0"
+
+    # the paths times the points of a simulation, e.g. 10000 paths over 30 years of 12 points each
+    monte_carlo_max_cells = int(os.getenv('MONTE_CARLO_MAX_CELLS', 4000000))
+    assert monte_carlo_max_cells > 0, "The MONTE_CARLO_MAX_CELLS environment variable must be greater than 0"
+
+    monte_carlo_block_cells = int(os.getenv('MONTE_CARLO_BLOCK_CELLS', 2000000))
+    assert monte_carlo_block_cells > 0, "The MONTE_CARLO_BLOCK_CELLS environment variable must be greater than 0"
+
+    compute_executor = os.getenv('COMPUTE_EXECUTOR', 'thread')
+    assert compute_executor in ('thread', 'process'), "The COMPUTE_EXECUTOR environment variable must be either thread or process"
+
+    compute_workers = int(os.getenv('COMPUTE_WORKERS', os.cpu_count() or 1))
+    assert compute_workers > 0, "The COMPUTE_WORKERS environment variable must be greater than 0"
+
+    compute_queue_size = int(os.getenv('COMPUTE_QUEUE_SIZE', 64))
+    assert compute_queue_size >= 0, "The COMPUTE_QUEUE_SIZE environment variable must be greater than or equal to 0"
+
+    compute_retry_after = int(os.getenv('COMPUTE_RETRY_AFTER', 1))
+    assert compute_retry_after > 0, "The COMPUTE_RETRY_AFTER environment variable must be greater than 0"
+
+    compute_chunk_cells = int(os.getenv('COMPUTE_CHUNK_CELLS', 250000))
+    assert compute_chunk_cells > 0, "The COMPUTE_CHUNK_CELLS environment variable must be greater than 0"
+
+    workers = int(os.getenv('WORKERS', 1))
+    assert workers > 0, "The WORKERS environment variable must be greater than 0"
+    assert workers == 1 or not debug, "Multiple WORKERS are not supported in DEBUG mode"
+
+    loop = os.getenv('LOOP', 'auto')
+    assert loop in ('auto', 'asyncio', 'uvloop'), "The LOOP environment variable must be one of auto, asyncio or uvloop"
+
+    http = os.getenv('HTTP', 'auto')
+    assert http in ('auto', 'h11', 'httptools'), "The HTTP environment variable must be one of auto, h11 or httptools"
+
+    backlog = int(os.getenv('BACKLOG', 2048))
+    assert backlog > 0, "The BACKLOG environment variable must be greater than 0"
+
+    keep_alive_timeout = int(os.getenv('KEEP_ALIVE_TIMEOUT', 5))
+    assert keep_alive_timeout >= 0, "The KEEP_ALIVE_TIMEOUT environment variable must be greater than or equal to 0"
+
+    graceful_shutdown_timeout = int(os.getenv('GRACEFUL_SHUTDOWN_TIMEOUT', 30))
+    assert graceful_shutdown_timeout > 0, "The GRACEFUL_SHUTDOWN_TIMEOUT environment variable must be greater than 0"
+
+    metrics = os.getenv('METRICS', 'true').lower() not in ('0', 'false', 'no')
+
+    server_timing = os.getenv('SERVER_TIMING', 'true').lower() not in ('0', 'false', 'no')
+
+    optimize_max_candidates = int(os.getenv('OPTIMIZE_MAX_CANDIDATES', 1000000))
+    assert optimize_max_candidates > 0, "The OPTIMIZE_MAX_CANDIDATES environment variable must be greater than 0"
+
+    stream_max_connections = int(os.getenv('STREAM_MAX_CONNECTIONS', 10000))
+    assert stream_max_connections > 0, "The STREAM_MAX_CONNECTIONS environment variable must be greater than 0"
+
+    stream_max_message_bytes = int(os.getenv('STREAM_MAX_MESSAGE_BYTES', 4096))
+    assert stream_max_message_bytes > 0, "The STREAM_MAX_MESSAGE_BYTES environment variable must be greater than 0"
+
+    stream_idle_timeout = float(os.getenv('STREAM_IDLE_TIMEOUT', 300))
+    assert stream_idle_timeout > 0, "The STREAM_IDLE_TIMEOUT environment variable must be greater than 0"
+
+    stream_auth_timeout = float(os.getenv('STREAM_AUTH_TIMEOUT', 10))
+    assert stream_auth_timeout > 0, "The STREAM_AUTH_TIMEOUT environment variable must be greater than 0"
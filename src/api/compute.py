@@ -0,0 +1,112 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import math
+import typing as t
+
+from metrics import Collected
+import cfg
+
+class Saturated(Exception):
+    """Raised when a computation is not admitted because the pool is saturated."""
+    pass
+
+
+class ComputePool:
+    """A bounded pool computing the synchronous engine functions off the event loop.
+
+    Computations are admitted while fewer than workers + queue_size are in flight, beyond that
+    admit raises Saturated immediately instead of queueing, so the server can shed load with a
+    fast response. The pool is only used from the event loop, so the counters need no lock.
+
+    @param executor: thread or process. Threads avoid copying the arrays and suffice as numpy
+        releases the GIL in its loops, processes scale pure Python work across cores.
+    @param workers: The number of threads or processes.
+    @param queue_size: The number of admitted computations waiting for a worker.
+    """
+    def __init__(self, executor: str, workers: int, queue_size: int):
+        self.kind = executor
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._executor = None
+
+    def executor(self) -> concurrent.futures.Executor:
+        """The executor, started on first use so worker processes are forked after the configuration is loaded."""
+        if self._executor is None:
+            if self.kind == 'process':
+                self._executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix='compute')
+        return self._executor
+
+    @contextlib.contextmanager
+    def admit(self):
+        """Admit a computation, which may consist of many tasks, for the duration of the context."""
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise Saturated(f"All {self.capacity} computation slots are in use")
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def run(self, fn: t.Callable, *args) -> t.Any:
+        """Run a function in the pool, the function and arguments must be picklable for processes."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor(), functools.partial(fn, *args))
+
+    async def map(self, fn: t.Callable, *iterables, limit: t.Optional[int] = None) -> list:
+        """Run a function for each of the arguments in parallel, the results keep their order.
+
+        @param limit: The number of tasks submitted to the executor at once, all of them if None.
+            Limits a computation of many tasks to its share of the workers, so it does not queue
+            ahead of the computations admitted after it.
+        """
+        if limit is None:
+            return list(await asyncio.gather(*(self.run(fn, *args) for args in zip(*iterables))))
+        slots = asyncio.Semaphore(limit)
+
+        async def run(args: tuple) -> t.Any:
+            async with slots:
+                return await self.run(fn, *args)
+        return list(await asyncio.gather(*(run(args) for args in zip(*iterables))))
+
+    def parts(self, cells: int) -> int:
+        """The number of chunks a workload of cells is split into, one per worker at most."""
+        return max(1, min(self.workers, math.ceil(cells / cfg.compute_chunk_cells)))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+_pool: ComputePool = None
+
+def pool() -> ComputePool:
+    """The compute pool of the server, created on first use from the configuration."""
+    global _pool
+    if _pool is None:
+        _pool = ComputePool(cfg.compute_executor, cfg.compute_workers, cfg.compute_queue_size)
+    return _pool
+
+
+def shutdown():
+    """Stop the workers of the compute pool, if it was started."""
+    if _pool is not None:
+        _pool.shutdown()
+
+
+Collected(
+    'car_roi_compute_admissions_total', 'counter', "The computations admitted to or rejected by the compute pool.", ('result',),
+    lambda: {} if _pool is None else {('admitted',): _pool.admitted, ('rejected',): _pool.rejected}
+)
+Collected(
+    'car_roi_compute_in_flight', 'gauge', "The computations running or waiting in the compute pool.", (),
+    lambda: {} if _pool is None else {(): _pool.in_flight}
+)
@@ -0,0 +1,85 @@
+import functools
+import importlib.util
+import io
+import json
+import typing as t
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+JSON_MEDIA_TYPE = 'application/json'
+
+def negotiate(accept: t.Optional[str], available: t.List[str]) -> t.Optional[str]:
+    """Select the media type of a response from the Accept header of the request.
+
+    @param accept: The Accept header, None accepts any media type.
+    @param available: The media types the response can be encoded in, the first is preferred.
+    @return: The available media type with the highest quality, None if none is acceptable.
+    """
+    if not accept:
+        return available[0]
+    best, best_quality = None, 0.0
+    for media_range in accept.split(','):
+        media_type, *params = media_range.strip().split(';')
+        media_type = media_type.strip().lower()
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type in ('*/*', '*'):
+            candidates = available
+        elif media_type.endswith('/*'):
+            candidates = [candidate for candidate in available if candidate.startswith(media_type[:-1])]
+        else:
+            candidates = [candidate for candidate in available if candidate == media_type]
+        # for equal quality the preference of the server wins
+        for candidate in candidates:
+            if quality > best_quality or (quality == best_quality and best is not None
+                    and available.index(candidate) < available.index(best)):
+                best, best_quality = candidate, quality
+    return best
+
+
+@functools.lru_cache(maxsize=None)
+def arrow_available() -> bool:
+    """Whether the optional pyarrow dependency is installed, without importing it."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def encode_json(content: t.Any) -> bytes:
+    """Encode content with numpy arrays as compact JSON, using orjson, a requirement of the api, if it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        default=lambda value: value.tolist(),
+    ).encode("utf-8")
+
+
+def decode_json(content: t.Union[str, bytes]) -> t.Any:
+    """Decode JSON, using orjson if it is installed."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def encode_arrow(columns: t.Dict[str, t.Any]) -> bytes:
+    """Encode equally long columns as a single record batch in an Arrow IPC stream."""
+    import pyarrow as pa
+
+    batch = pa.RecordBatch.from_pydict({name: pa.array(column) for name, column in columns.items()})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Evaluate the cost of many scenarios from a CSV or JSON lines file.
+
+    python evaluate.py offers.csv costs.parquet --years 5 10 15 --workers 4
+
+Every row of the input holds the prediction parameters of one scenario, except for the fields
+of the time axis, which are the same for every scenario and set with --horizon-years and
+--points-per-year. The input is read in chunks, each chunk is validated and computed in a
+worker process, and the results are written in input order as soon as they are ready, so
+the memory is bounded by the chunks in flight instead of the size of the input.
+
+Each output row holds the row number of the scenario in the input, its parameters and the
+cost of every strategy at every year, in columns named like cost_leasing_2.5.
+"""
+
+import os
+import sys
+# the core package is shared between the api and the app
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import argparse
+import collections
+import concurrent.futures
+import csv
+import dataclasses
+import io
+import itertools
+import time
+import typing as t
+
+import numpy as np
+
+from core.prediction import engine
+from core.prediction.model import PredictionParameters, AXIS_FIELDS, HORIZON_YEARS, POINTS_PER_YEAR, MAX_HORIZON_YEARS, MAX_POINTS_PER_YEAR
+from core.prediction.service import invalid_parameter_sets
+import encoding
+
+# the parameters of a scenario in the order of the output columns
+PARAMETER_FIELDS = tuple(field.name for field in dataclasses.fields(PredictionParameters) if field.name not in AXIS_FIELDS)
+INPUT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+OUTPUT_FORMATS = {'.csv': 'csv', '.parquet': 'parquet'}
+
+@dataclasses.dataclass
+class Chunk:
+    """A chunk of the input.
+        - start: The row number of the first row in the input, counting from 0.
+        - rows: The rows as lists of strings in the order of PARAMETER_FIELDS for CSV,
+          or as lines of JSON objects.
+    """
+    start: int
+    rows: list
+
+
+@dataclasses.dataclass
+class ChunkResult:
+    """The result of a chunk.
+        - rows: The number of rows in the chunk.
+        - invalid: The rows which were skipped, mapped to the reason.
+        - output: The encoded CSV rows, or the columns of a Parquet row group.
+    """
+    rows: int
+    invalid: t.Dict[int, str]
+    output: t.Union[bytes, t.Dict[str, np.ndarray]]
+
+
+def read_chunks(path: str, input_format: str, chunk_size: int) -> t.Iterator[Chunk]:
+    """Read the rows of the input in chunks, without parsing the values."""
+    with open(path, newline='' if input_format == 'csv' else None, encoding='utf-8') as file:
+        if input_format == 'csv':
+            reader = csv.reader(file)
+            header = [name.strip() for name in next(reader, [])]
+            axis = set(header).intersection(AXIS_FIELDS)
+            assert not axis, f"The time axis is set with --horizon-years and --points-per-year, not the columns {', '.join(sorted(axis))}"
+            missing = set(PARAMETER_FIELDS).difference(header)
+            assert not missing, f"Missing columns: {', '.join(sorted(missing))}"
+            order = [header.index(name) for name in PARAMETER_FIELDS]
+            rows = ([row[index] if index < len(row) else '' for index in order] for row in reader if row)
+        else:
+            rows = (line for line in file if line.strip())
+        start = 0
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield Chunk(start, chunk)
+            start += len(chunk)
+
+
+def parse_chunk(chunk: Chunk, input_format: str) -> t.Tuple[t.Dict[str, np.ndarray], t.Dict[int, str]]:
+    """Parse the rows of a chunk into integer columns of shape (n, 1).
+
+        @return: A tuple (columns, invalid) with the rows which cannot be parsed mapped to the
+            reason, their values in the columns are 0.
+    """
+    invalid = {}
+    if input_format == 'jsonl':
+        rows = []
+        for index, line in enumerate(chunk.rows):
+            try:
+                row = encoding.decode_json(line)
+                assert isinstance(row, dict), "The row must be an object"
+                axis = set(row).intersection(AXIS_FIELDS)
+                assert not axis, f"The time axis cannot be set per row: {', '.join(sorted(axis))}"
+                rows.append([row[name] for name in PARAMETER_FIELDS])
+            except KeyError as error:
+                invalid[chunk.start + index] = f"{error} is required"
+                rows.append([0] * len(PARAMETER_FIELDS))
+            except Exception as error:
+                invalid[chunk.start + index] = str(error)
+                rows.append([0] * len(PARAMETER_FIELDS))
+    else:
+        rows = chunk.rows
+
+    columns = {}
+    for position, name in enumerate(PARAMETER_FIELDS):
+        values = [row[position] for row in rows]
+        try:
+            column = np.array(values, dtype=np.int64)
+        except (TypeError, ValueError, OverflowError):
+            # find the values which are not integers, only if there are any
+            column = np.zeros(len(values), dtype=np.int64)
+            for index, value in enumerate(values):
+                try:
+                    column[index] = int(value)
+                except (TypeError, ValueError, OverflowError):
+                    invalid.setdefault(chunk.start + index, f"{name} must be an integer")
+        columns[name] = column.reshape(-1, 1)
+    return columns, invalid
+
+
+def evaluate_chunk(chunk: Chunk, input_format: str, output_format: str, month: np.ndarray, names: t.List[str]) -> ChunkResult:
+    """Parse, validate and compute a chunk, runs in a worker process."""
+    columns, invalid = parse_chunk(chunk, input_format)
+    for message, indices in invalid_parameter_sets(columns).items():
+        for index in indices.tolist():
+            invalid.setdefault(chunk.start + index, message)
+
+    valid = np.ones(len(chunk.rows), dtype=bool)
+    valid[[row - chunk.start for row in invalid]] = False
+    columns = {name: column[valid] for name, column in columns.items()}
+    costs = engine.predict(month, columns)
+
+    output = {'row': np.flatnonzero(valid) + chunk.start}
+    output.update((name, column[:, 0]) for name, column in columns.items())
+    values = np.hstack(costs) if costs[0].size else np.empty((0, len(names) - len(output)))
+    if output_format == 'parquet':
+        output.update((name, values[:, index]) for index, name in enumerate(names[len(output):]))
+        return ChunkResult(len(chunk.rows), invalid, output)
+
+    # the parameters are exact as floats, so one matrix formats them and the costs at once
+    table = np.hstack([np.column_stack(list(output.values())).astype(np.float64), values])
+    buffer = io.StringIO()
+    np.savetxt(buffer, table, fmt=['%d'] * len(output) + ['%.15g'] * values.shape[1], delimiter=',')
+    return ChunkResult(len(chunk.rows), invalid, buffer.getvalue().encode('utf-8'))
+
+
+class Writer:
+    """Write the results of the chunks to a CSV or Parquet file, pyarrow is only loaded for Parquet."""
+    def __init__(self, path: str, output_format: str, names: t.List[str]):
+        self.output_format = output_format
+        self.names = names
+        if output_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = pa.schema([
+                (name, pa.int64() if index <= len(PARAMETER_FIELDS) else pa.float64())
+                for index, name in enumerate(names)
+            ])
+            self.file = pq.ParquetWriter(path, schema)
+        else:
+            self.file = open(path, 'wb')
+            self.file.write((','.join(names) + '\n').encode('utf-8'))
+
+    def write(self, output: t.Union[bytes, t.Dict[str, np.ndarray]]):
+        if self.output_format == 'parquet':
+            import pyarrow as pa
+
+            if len(output['row']):
+                self.file.write_table(pa.table(output, schema=self.file.schema))
+        else:
+            self.file.write(output)
+
+    def close(self):
+        self.file.close()
+
+
+def evaluate(
+    input_path: str,
+    output_path: str,
+    input_format: str,
+    output_format: str,
+    years: t.Optional[t.List[float]],
+    horizon_years: int,
+    points_per_year: int,
+    chunk_size: int,
+    chunk_cells: int,
+    workers: int,
+    skip_invalid: bool,
+    progress: t.TextIO = sys.stderr
+) -> dict:
+    """Evaluate every scenario of the input and write the costs to the output.
+
+        @return: The statistics of the run, with the number of rows, of skipped rows and the seconds.
+    """
+    assert 0 < horizon_years <= MAX_HORIZON_YEARS, f"horizon_years must be between 1 and {MAX_HORIZON_YEARS}"
+    assert 0 < points_per_year <= MAX_POINTS_PER_YEAR, f"points_per_year must be between 1 and {MAX_POINTS_PER_YEAR}"
+    if years:
+        year = np.array(sorted(set(years)), dtype=np.float64)
+        assert year[0] > 0, "years must be greater than 0"
+        month = year * 12
+    else:
+        year, month = engine.time_axis(horizon_years, points_per_year)
+        assert year.size > 0, "The time axis must contain at least one point"
+    names = ['row', *PARAMETER_FIELDS] + [f"{curve}_{value:g}" for curve in engine.CURVE_FIELDS for value in year.tolist()]
+    # bound the memory of a chunk by the number of costs it computes
+    chunk_size = max(1, min(chunk_size, chunk_cells // (len(engine.CURVE_FIELDS) * month.size)))
+
+    start = time.perf_counter()
+    rows = 0
+    skipped = 0
+    writer = Writer(output_path, output_format, names)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            pending = collections.deque()
+
+            def write_next():
+                nonlocal rows, skipped
+                result = pending.popleft().result()
+                if result.invalid:
+                    if not skip_invalid:
+                        row, message = min(result.invalid.items())
+                        raise AssertionError(f"Invalid row {row}: {message}, pass --skip-invalid to skip invalid rows")
+                    for row, message in sorted(result.invalid.items()):
+                        print(f"Skipped row {row}: {message}", file=progress)
+                writer.write(result.output)
+                rows += result.rows
+                skipped += len(result.invalid)
+                elapsed = time.perf_counter() - start
+                print(f"{rows} rows, {skipped} skipped, {elapsed:.1f} s, {rows / elapsed:.0f} rows/s", file=progress)
+
+            # at most two chunks per worker are in flight, so reading does not outpace the workers
+            for chunk in read_chunks(input_path, input_format, chunk_size):
+                pending.append(executor.submit(evaluate_chunk, chunk, input_format, output_format, month, names))
+                if len(pending) >= 2 * workers:
+                    write_next()
+            while pending:
+                write_next()
+    finally:
+        writer.close()
+    return {"rows": rows, "skipped": skipped, "seconds": time.perf_counter() - start}
+
+
+def file_format(path: str, formats: t.Dict[str, str], given: t.Optional[str]) -> str:
+    if given:
+        return given
+    extension = os.path.splitext(path)[1].lower()
+    assert extension in formats, f"Cannot infer the format of {path}, expected one of {', '.join(formats)}"
+    return formats[extension]
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate the cost of the scenarios in a CSV or JSON lines file.")
+    parser.add_argument('input', help="The scenarios, a .csv file with a header or a .jsonl file of objects.")
+    parser.add_argument('output', help="The costs, a .csv or .parquet file.")
+    parser.add_argument('--input-format', choices=sorted(set(INPUT_FORMATS.values())), help="Overrides the format inferred from the extension.")
+    parser.add_argument('--output-format', choices=sorted(set(OUTPUT_FORMATS.values())), help="Overrides the format inferred from the extension.")
+    parser.add_argument('--years', type=float, nargs='+', help="Only compute the costs at these years instead of the time axis.")
+    parser.add_argument('--horizon-years', type=int, default=HORIZON_YEARS)
+    parser.add_argument('--points-per-year', type=int, default=POINTS_PER_YEAR)
+    parser.add_argument('--chunk-size', type=int, default=10000, help="The maximum number of rows per chunk.")
+    parser.add_argument('--chunk-cells', type=int, default=10000000, help="The maximum number of costs computed per chunk.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--skip-invalid', action='store_true', help="Skip invalid rows instead of stopping at the first.")
+    args = parser.parse_args(argv)
+
+    try:
+        assert args.chunk_size > 0, "--chunk-size must be greater than 0"
+        assert args.chunk_cells > 0, "--chunk-cells must be greater than 0"
+        assert args.workers > 0, "--workers must be greater than 0"
+        input_format = file_format(args.input, INPUT_FORMATS, args.input_format)
+        output_format = file_format(args.output, OUTPUT_FORMATS, args.output_format)
+        assert output_format != 'parquet' or encoding.arrow_available(), "Writing Parquet requires pyarrow"
+        stats = evaluate(
+            args.input,
+            args.output,
+            input_format,
+            output_format,
+            args.years,
+            args.horizon_years,
+            args.points_per_year,
+            args.chunk_size,
+            args.chunk_cells,
+            args.workers,
+            args.skip_invalid
+        )
+    except (AssertionError, OSError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    print(f"Evaluated {stats['rows'] - stats['skipped']} of {stats['rows']} rows in {stats['seconds']:.1f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import math
+import time
+import typing as t
+
+from starlette.responses import JSONResponse
+
+from metrics import Counter, Collected
+import cfg
+
+LIMITED = Counter('car_roi_limited_total', "The number of requests rejected by a limit before they were handled.", ('reason',))
+
+class TokenBucket:
+    """Admit a sustained rate of requests with bursts of up to capacity requests.
+
+    @param rate: The tokens added per second.
+    @param capacity: The maximum number of tokens, the bucket starts full.
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token, returns 0 if one was taken or else the seconds until the next token."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class LimitMiddleware:
+    """Reject requests over the rate limit of their client or over the concurrency limit of the worker.
+
+    Must be placed after the authentication middleware, the rate of a request is accounted to
+    the name of its client, unauthenticated requests share one bucket. Rejected requests are
+    answered before any route runs, 429 if the client exceeds its rate and 503 if the worker
+    handles too many requests at once. Every worker process has its own limits, and the state
+    is only used from the event loop, so it needs no lock. Websockets are not limited, the
+    stream limits its connections itself.
+
+    @param rate: The requests per second each client may sustain, 0 disables the rate limit.
+    @param burst: The requests a client may send at once above its rate.
+    @param max_concurrent: The requests handled at once, 0 disables the concurrency limit.
+    @param exempt: The paths which are never limited, e.g. the metrics of an overloaded server.
+    """
+    def __init__(self, app, rate: float = 0, burst: int = 1, max_concurrent: int = 0, exempt: t.Tuple[str, ...] = ('/metrics',)):
+        self.app = app
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.exempt = exempt
+        self.in_flight = 0
+        # the client names are bounded by the configured client keys
+        self.buckets: t.Dict[str, TokenBucket] = {}
+        _middlewares.append(self)
+
+    def retry_after(self, scope) -> float:
+        """The seconds until the client of a request may send it, 0 if it is admitted."""
+        if not self.rate:
+            return 0.0
+        user = scope.get('user')
+        client = user.display_name if user is not None and user.is_authenticated else ''
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            bucket = self.buckets[client] = TokenBucket(self.rate, self.burst)
+        return bucket.take()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] in self.exempt:
+            await self.app(scope, receive, send)
+            return
+
+        if self.max_concurrent and self.in_flight >= self.max_concurrent:
+            LIMITED.inc('concurrency')
+            response = JSONResponse(
+                {"error": "The server is busy, please retry later"},
+                status_code=503,
+                headers={"Retry-After": str(cfg.compute_retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        wait = self.retry_after(scope)
+        if wait:
+            LIMITED.inc('rate')
+            response = JSONResponse(
+                {"error": "Too many requests, please retry later"},
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+            await response(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+
+# the middlewares of the application, a middleware stack is built once per application
+_middlewares: t.List[LimitMiddleware] = []
+
+Collected(
+    'car_roi_requests_in_flight', 'gauge', "The requests handled at once, counted by the limit middleware.", (),
+    lambda: {(): sum(middleware.in_flight for middleware in _middlewares)}
+)
+Collected(
+    'car_roi_limit', 'gauge', "The configured limits of a worker, 0 if a limit is disabled.", ('limit',),
+    lambda: {} if not _middlewares else {
+        ('rate',): _middlewares[-1].rate,
+        ('burst',): _middlewares[-1].burst,
+        ('max_concurrent',): _middlewares[-1].max_concurrent,
+    }
+)
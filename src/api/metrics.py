@@ -0,0 +1,185 @@
+import bisect
+import time
+import typing as t
+
+from starlette.datastructures import MutableHeaders
+
+# the upper bounds of the latency buckets in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MEDIA_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# the metrics exposed by render, in order of registration
+_registry: list = []
+
+def format_labels(names: t.Tuple[str, ...], values: t.Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+class Counter:
+    """A monotonically increasing count per combination of label values.
+
+    The metrics are only updated from the event loop, so they do not need a lock. Every worker
+    process has its own metrics.
+    """
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: t.Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> t.Iterator[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{format_labels(self.labels, labels)} {value}"
+
+
+class Histogram:
+    """A distribution of observed values in cumulative buckets per combination of label values."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: t.Tuple[str, ...] = (), buckets: t.Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # the counts per bucket, the last bucket is +Inf, followed by the sum of all values
+        self.values = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *labels: str):
+        counts = self.values.get(labels)
+        if counts is None:
+            counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self) -> t.Iterator[str]:
+        names = self.labels + ('le',)
+        for labels, counts in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{format_labels(names, labels + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labels, labels)} {counts[-1]}"
+            yield f"{self.name}_count{format_labels(self.labels, labels)} {cumulative}"
+
+
+class Collected:
+    """A metric whose values are collected when rendered, e.g. the statistics of a cache.
+
+    @param collect: Returns the values mapped to tuples of label values.
+    """
+    def __init__(self, name: str, kind: str, help: str, labels: t.Tuple[str, ...], collect: t.Callable[[], dict]):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labels = labels
+        self.collect = collect
+        _registry.append(self)
+
+    def samples(self) -> t.Iterator[str]:
+        for labels, value in self.collect().items():
+            yield f"{self.name}{format_labels(self.labels, labels)} {value}"
+
+
+def render() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+REQUESTS = Counter('car_roi_requests_total', "The number of handled requests.", ('route', 'method', 'status'))
+ERRORS = Counter('car_roi_errors_total', "The number of requests answered with an error status.", ('route', 'status'))
+REQUEST_LATENCY = Histogram('car_roi_request_duration_seconds', "The time to handle a request.", ('route',))
+STAGE_LATENCY = Histogram('car_roi_stage_duration_seconds', "The time spent in a stage of a request.", ('stage', 'route'))
+
+
+class Stage:
+    """Measure the duration of a stage of a request.
+
+    A no-op if the request is not instrumented. A stage entered multiple times accumulates.
+
+        with Stage(request.scope, 'compute'):
+            ...
+    """
+    __slots__ = ('timings', 'name', 'start')
+
+    def __init__(self, scope: dict, name: str):
+        self.timings = scope.get('timings')
+        self.name = name
+
+    def __enter__(self):
+        if self.timings is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+def route_name(scope: dict) -> str:
+    """The label of the route which handled a request, bounded to the known endpoints."""
+    # a mount which did not match any of its routes sets its router as the endpoint
+    name = getattr(scope.get('endpoint'), '__name__', None)
+    if name is not None:
+        return name
+    return 'preflight' if scope.get('method') == 'OPTIONS' else 'unmatched'
+
+
+class MetricsMiddleware:
+    """Record the count, status and the stage latencies of every request.
+
+    Must be the outermost middleware, so the timings include the CORS and authentication
+    middlewares. The stages are measured with Stage and stored in the scope of the request.
+
+    @param record: Whether to record the metrics exposed by render.
+    @param server_timing: Whether to add a Server-Timing header with the stage durations.
+    """
+    def __init__(self, app, record: bool = True, server_timing: bool = True):
+        self.app = app
+        self.record = record
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = scope['timings'] = {}
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if self.server_timing:
+                    entries = [f"{name};dur={duration * 1000:.3f}" for name, duration in timings.items()]
+                    entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.3f}")
+                    MutableHeaders(scope=message).append('Server-Timing', ', '.join(entries))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if self.record:
+                route = route_name(scope)
+                REQUESTS.inc(route, scope['method'], str(status))
+                if status >= 400:
+                    ERRORS.inc(route, str(status))
+                REQUEST_LATENCY.observe(time.perf_counter() - start, route)
+                for name, duration in timings.items():
+                    STAGE_LATENCY.observe(duration, name, route)
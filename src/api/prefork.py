@@ -0,0 +1,87 @@
+import logging
+import os
+import signal
+import typing as t
+
+import uvicorn
+
+class Worker(uvicorn.Server):
+    """A server which shuts down when its supervisor is gone, so killed supervisors leave no orphans."""
+    def __init__(self, config: uvicorn.Config, supervisor: int):
+        super().__init__(config)
+        self.supervisor = supervisor
+
+    async def on_tick(self, counter: int) -> bool:
+        if counter % 10 == 0 and os.getppid() != self.supervisor:
+            self.should_exit = True
+        return await super().on_tick(counter)
+
+
+def serve(config: uvicorn.Config, workers: int, warm_up: t.Optional[t.Callable[[], None]] = None):
+    """Serve an application with a number of forked worker processes sharing one listening socket.
+
+    The application is imported and warmed up once in the supervisor before the workers are
+    forked, so the workers share the imported modules and start accepting immediately. A
+    worker which dies is replaced. SIGINT or SIGTERM shut the workers down gracefully, workers
+    which did not exit within the graceful shutdown timeout of the config are killed.
+
+    @param config: The uvicorn configuration of every worker.
+    @param workers: The number of worker processes, 1 serves in the current process.
+    @param warm_up: Called once before the workers are forked.
+    """
+    config.load()
+    if warm_up is not None:
+        warm_up()
+    if workers == 1:
+        uvicorn.Server(config).run()
+        return
+
+    sock = config.bind_socket()
+    supervisor = os.getpid()
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            # the worker installs its own handlers for a graceful shutdown
+            for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGALRM):
+                signal.signal(signum, signal.SIG_DFL)
+            try:
+                Worker(config, supervisor).run(sockets=[sock])
+            finally:
+                os._exit(0)
+        children.add(pid)
+        logging.info(f"Started worker {pid}")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        if not stopping:
+            logging.info(f"Stopping {len(children)} workers")
+            stopping = True
+            signal.alarm((config.timeout_graceful_shutdown or 30) + 5)
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    def kill(signum, frame):
+        for pid in children:
+            logging.error(f"Killing worker {pid} after the graceful shutdown timeout")
+            os.kill(pid, signal.SIGKILL)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGALRM, kill)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            logging.error(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            spawn()
+    signal.alarm(0)
+    sock.close()
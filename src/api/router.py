@@ -1,8 +1,41 @@
-import routes.prediction.route
-from starlette.routing import Mount, Route
+from starlette.routing import Mount, Route, WebSocketRoute
+import importlib
 
-get_prediction_data = routes.prediction.route.get_prediction_data
+def lazy_endpoint(module: str, name: str):
+    """An endpoint which imports its module on the first request.
+
+    The route modules import numpy and the engine, so the server starts without them and a
+    feature only loads its dependencies once it is used.
+    """
+    handler = None
+
+    async def endpoint(request):
+        nonlocal handler
+        if handler is None:
+            handler = getattr(importlib.import_module(module), name)
+        return await handler(request)
+
+    endpoint.__name__ = name
+    endpoint.__qualname__ = name
+    return endpoint
+
+
+get_prediction_data = lazy_endpoint('routes.prediction.route', 'get_prediction_data')
+post_prediction_batch = lazy_endpoint('routes.prediction.route', 'post_prediction_batch')
+post_prediction_sweep = lazy_endpoint('routes.prediction.route', 'post_prediction_sweep')
+get_prediction_breakeven = lazy_endpoint('routes.prediction.route', 'get_prediction_breakeven')
+post_prediction_montecarlo = lazy_endpoint('routes.prediction.route', 'post_prediction_montecarlo')
+post_prediction_optimize = lazy_endpoint('routes.prediction.route', 'post_prediction_optimize')
+stream_prediction_data = lazy_endpoint('routes.prediction.route', 'stream_prediction_data')
+get_metrics = lazy_endpoint('routes.metrics.route', 'get_metrics')
 
 api_routes = Mount("", routes=[
-    Route("/prediction", get_prediction_data, methods=["GET"])
+    Route("/prediction", get_prediction_data, methods=["GET"]),
+    Route("/prediction/batch", post_prediction_batch, methods=["POST"]),
+    Route("/prediction/sweep", post_prediction_sweep, methods=["POST"]),
+    Route("/prediction/breakeven", get_prediction_breakeven, methods=["GET"]),
+    Route("/prediction/montecarlo", post_prediction_montecarlo, methods=["POST"]),
+    Route("/prediction/optimize", post_prediction_optimize, methods=["POST"]),
+    WebSocketRoute("/prediction/stream", stream_prediction_data),
+    Route("/metrics", get_metrics, methods=["GET"]),
 ])
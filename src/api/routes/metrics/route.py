@@ -0,0 +1,20 @@
+import logging
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+import metrics
+import cfg
+
+async def get_metrics(request: Request) -> Response:
+    logging.info(f"Received get_metrics request")
+
+    if (not request.user.is_authenticated):
+        logging.error(f"Unauthenticated user: {request.user}")
+        return JSONResponse({"error": "Not authenticated"}, status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+    if not cfg.metrics:
+        logging.error(f"Metrics are disabled")
+        return JSONResponse({"error": "Metrics are disabled"}, status_code=404)
+
+    return Response(metrics.render(), status_code=200, media_type=metrics.MEDIA_TYPE)
@@ -1,11 +1,169 @@
+import asyncio
+import dataclasses
 import logging
+import base64
+import hashlib
+import typing as t
+import numpy as np
 
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
+from starlette.websockets import WebSocket
 
-from routes.prediction.service import create_prediction_data_frame, PredictionParameters
+from core.prediction.service import (
+    create_prediction_curves, PredictionParameters, PredictionResult,
+    create_parameter_columns, ensure_valid_columns, create_prediction_batch,
+    split_parameter_columns, concatenate_batches,
+    create_parameter_ranges, count_sweep_cells, create_parameter_grid, create_prediction_sweep,
+    split_parameter_grid, concatenate_sweeps,
+    create_breakeven, downsample_prediction
+)
+from core.prediction.model import ensure_valid_years, ensure_valid_discount_rate
+from core.prediction import frame, montecarlo, optimize, ledger
+from core.prediction import engine
+from cache import LruCache
+from auth import ClientIdBearerTokenBackend
+from metrics import Stage, Collected, Counter
+from singleflight import SingleFlight
+import compute
+import encoding
+import cfg
 
-async def get_prediction_data(request: Request) -> JSONResponse:
+_prediction_cache: LruCache = None
+
+def prediction_cache() -> LruCache:
+    """The cache of serialized prediction responses, created on first use from the configuration."""
+    global _prediction_cache
+    if _prediction_cache is None:
+        _prediction_cache = LruCache(cfg.cache_max_size, cfg.cache_ttl)
+    return _prediction_cache
+
+
+Collected(
+    'car_roi_prediction_cache_events_total', 'counter', "The lookups and evictions of the prediction cache.", ('event',),
+    lambda: {} if _prediction_cache is None else {
+        ('hit',): _prediction_cache.hits,
+        ('miss',): _prediction_cache.misses,
+        ('eviction',): _prediction_cache.evictions,
+    }
+)
+Collected(
+    'car_roi_prediction_cache_size', 'gauge', "The number of entries in the prediction cache.", (),
+    lambda: {} if _prediction_cache is None else {(): len(_prediction_cache)}
+)
+
+_curve_cache: LruCache = None
+
+def curve_cache() -> LruCache:
+    """The cache of the cost curves of single predictions, created on first use from the configuration.
+
+    With the process executor every compute process has its own curve cache.
+    """
+    global _curve_cache
+    if _curve_cache is None:
+        _curve_cache = LruCache(cfg.curve_cache_max_size, cfg.cache_ttl)
+    return _curve_cache
+
+
+Collected(
+    'car_roi_curve_cache_events_total', 'counter', "The lookups and evictions of the cost curve cache.", ('event',),
+    lambda: {} if _curve_cache is None else {
+        ('hit',): _curve_cache.hits,
+        ('miss',): _curve_cache.misses,
+        ('eviction',): _curve_cache.evictions,
+    }
+)
+
+# concurrent requests for the same prediction share one computation, with or without the cache
+prediction_flights = SingleFlight()
+
+Collected(
+    'car_roi_prediction_coalesced_total', 'counter',
+    "The prediction requests which started a computation or shared one already in flight.", ('role',),
+    lambda: {('leader',): prediction_flights.leaders, ('shared',): prediction_flights.shared}
+)
+
+
+def prediction_media_types() -> list:
+    """The media types a prediction can be encoded in, in order of preference."""
+    media_types = [encoding.JSON_MEDIA_TYPE, frame.MEDIA_TYPE]
+    if encoding.arrow_available():
+        media_types.append(encoding.ARROW_MEDIA_TYPE)
+    return media_types
+
+
+def busy_response() -> JSONResponse:
+    return JSONResponse(
+        {"error": "The server is busy, please retry later"},
+        status_code=503,
+        headers={"Retry-After": str(cfg.compute_retry_after)}
+    )
+
+
+def ensure_discountable(params: PredictionParameters, discount_rate: float):
+    """Validate that the cost curves of valid parameters can be discounted, see ledger.supports."""
+    if discount_rate and not all(ledger.supports(name, params.__dict__) for name in ledger.COMPONENTS):
+        raise AssertionError("Discounting requires purchase_years to be greater than purchase_used_age")
+
+
+def compute_prediction(params: PredictionParameters, max_points: int, discount_rate: float = 0.0) -> t.Tuple[PredictionResult, t.List[str]]:
+    """Compute a prediction from the cached cost curves, returns the result and the names of the cached curves."""
+    prediction_data, cached = create_prediction_curves(params, curve_cache(), discount_rate)
+    if max_points:
+        prediction_data = downsample_prediction(prediction_data, max_points)
+    return prediction_data, cached
+
+
+def curve_cache_header(cached: t.List[str]) -> str:
+    """The X-Curve-Cache header, stating for each cost curve whether it was taken from the cache."""
+    return ', '.join(f"{name}={'hit' if name in cached else 'miss'}" for name in engine.CURVE_FIELDS)
+
+
+def encode_prediction(prediction_data: PredictionResult, params: PredictionParameters, media_type: str) -> bytes:
+    if media_type == frame.MEDIA_TYPE:
+        return frame.encode(prediction_data, params.points_per_year)
+    if media_type == encoding.ARROW_MEDIA_TYPE:
+        return encoding.encode_arrow(prediction_data.__dict__)
+    return encoding.encode_json(prediction_data.__dict__)
+
+
+def prediction_etag(params: PredictionParameters, max_points: int, media_type: str, discount_rate: float = 0.0) -> str:
+    """A strong entity tag of a prediction, derived from the request without computing it."""
+    key = repr((engine.ENGINE_VERSION, params.key(), max_points, media_type, discount_rate)).encode('utf-8')
+    return f'"{hashlib.blake2b(key, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches an entity tag, using the weak comparison."""
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+def warm_up():
+    """Run every stage of a prediction once, so the modules and code paths are loaded before serving."""
+    params = PredictionParameters(
+        purchase_years=10,
+        purchase_new_price=30000,
+        purchase_used_price=20000,
+        purchase_used_age=3,
+        leasing_cost_per_month=300,
+        leasing_switch_cost=500,
+        leasing_years=3,
+        repair_cost_per_year=1000,
+        repair_free_years=2
+    )
+    prediction_data, _ = compute_prediction(params, 0)
+    downsample_prediction(prediction_data, 8)
+    # pyarrow stays unloaded until a client asks for arrow
+    for media_type in (encoding.JSON_MEDIA_TYPE, frame.MEDIA_TYPE):
+        encode_prediction(prediction_data, params, media_type)
+    create_breakeven(params)
+
+
+async def get_prediction_data(request: Request) -> Response:
     logging.info(f"Received get_prediction_data request")
 
     if (not request.user.is_authenticated):
@@ -13,17 +171,498 @@ async def get_prediction_data(request: Request) -> JSONResponse:
         return JSONResponse({"error": "Not authenticated"}, status_code=401, headers={"WWW-Authenticate": "Bearer"})
 
     try:
-        prediction_params = PredictionParameters(**request.query_params)
-        prediction_params.ensure_valid()
+        with Stage(request.scope, 'parse'):
+            query_params = dict(request.query_params)
+            max_points = int(query_params.pop('max_points', 0))
+            assert max_points == 0 or max_points >= 8, "max_points must be greater than or equal to 8"
+            discount_rate = ensure_valid_discount_rate(query_params.pop('discount_rate', 0))
+            prediction_params = PredictionParameters(**query_params)
+            prediction_params.ensure_valid()
+            ensure_discountable(prediction_params, discount_rate)
     except Exception as error:
         logging.error(f"Invalid request parameters: {request.query_params}")
         return JSONResponse({"error": "Invalid request parameters"}, status_code=400)
 
+    media_types = prediction_media_types()
+    with Stage(request.scope, 'parse'):
+        media_type = encoding.negotiate(request.headers.get('Accept'), media_types)
+    if media_type is None:
+        logging.error(f"Not acceptable: {request.headers.get('Accept')}")
+        return JSONResponse({"error": f"Acceptable media types are {', '.join(media_types)}"}, status_code=406)
+
+    etag = prediction_etag(prediction_params, max_points, media_type, discount_rate)
+    headers = {"ETag": etag, "Cache-Control": cfg.cache_control, "Vary": "Accept, Authorization"}
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and etag_matches(if_none_match, etag):
+        logging.info(f"Prediction data not modified")
+        return Response(status_code=304, headers=headers)
+
     try:
-        prediction_data = create_prediction_data_frame(prediction_params)
+        body, cached = await predict_cached(request.scope, prediction_params, max_points, media_type, discount_rate)
+    except compute.Saturated as error:
+        logging.error(f"Rejected prediction: {error}")
+        return busy_response()
     except Exception as error:
         logging.error(f"Error while creating prediction data frame: {error}")
         return JSONResponse({"error": "Error while computing prediction data"}, status_code=500)
 
+    if cached is None:
+        logging.info(f"Returning cached prediction data")
+        return Response(body, status_code=200, media_type=media_type, headers={**headers, "X-Cache": "hit"})
     logging.info(f"Returning prediction data")
-    return JSONResponse(prediction_data.__dict__, status_code=200)
+    return Response(body, status_code=200, media_type=media_type, headers={**headers, "X-Cache": "miss", "X-Curve-Cache": curve_cache_header(cached)})
+
+
+async def predict_cached(scope: dict, params: PredictionParameters, max_points: int, media_type: str, discount_rate: float = 0.0) -> t.Tuple[bytes, t.Optional[t.List[str]]]:
+    """The encoded prediction from the prediction cache, or computed in the compute pool and cached.
+
+    Concurrent computations of the same prediction are coalesced, raises compute.Saturated if
+    the computation is not admitted.
+
+        @return: A tuple (body, cached) with the names of the cost curves taken from the curve
+            cache, or None if the body was taken from the prediction cache.
+    """
+    cache = prediction_cache()
+    key = (params.key(), max_points, media_type, discount_rate)
+    body = cache.get(key)
+    if body is not None:
+        return body, None
+
+    compute_pool = compute.pool()
+
+    async def compute_body() -> t.Tuple[bytes, t.List[str]]:
+        # only the first of the coalesced requests computes, its stages are timed
+        with compute_pool.admit():
+            with Stage(scope, 'compute'):
+                prediction_data, cached = await compute_pool.run(compute_prediction, params, max_points, discount_rate)
+            with Stage(scope, 'serialize'):
+                body = await compute_pool.run(encode_prediction, prediction_data, params, media_type)
+        cache.put(key, body)
+        return body, cached
+
+    return await prediction_flights.do(key, compute_body)
+
+
+STREAM_UPDATES = Counter(
+    'car_roi_stream_updates_total', "The parameter updates received on prediction streams, by outcome.", ('result',)
+)
+# the number of open prediction streams of this worker
+_stream_sessions = 0
+
+Collected(
+    'car_roi_stream_sessions', 'gauge', "The number of open prediction streams.", (),
+    lambda: {(): _stream_sessions}
+)
+
+
+async def stream_message(scope: dict, data: t.Union[str, bytes]) -> str:
+    """Answer a parameter update of a prediction stream.
+
+    The update is a JSON object with the prediction parameters, an optional max_points, an
+    optional discount_rate and an optional id, which is echoed to correlate the answer. The answer is a JSON object with the
+    id and either the prediction data, or an error with the HTTP status it corresponds to.
+    """
+    update_id = None
+    try:
+        update = encoding.decode_json(data)
+        assert isinstance(update, dict), "The update must be an object"
+        assert update.get('id') is None or isinstance(update['id'], (str, int)), "The id must be a string or an integer"
+        update_id = update.get('id')
+        max_points = int(update.get('max_points', 0))
+        assert max_points == 0 or max_points >= 8, "max_points must be greater than or equal to 8"
+        discount_rate = ensure_valid_discount_rate(update.get('discount_rate', 0))
+        parameters = update.get('parameters')
+        assert isinstance(parameters, dict), "The parameters must be an object"
+        prediction_params = PredictionParameters(**parameters)
+        prediction_params.ensure_valid()
+        ensure_discountable(prediction_params, discount_rate)
+    except Exception as error:
+        logging.error(f"Invalid stream update: {error}")
+        STREAM_UPDATES.inc('invalid')
+        return encoding.encode_json({"id": update_id, "status": 400, "error": "Invalid request parameters"}).decode('utf-8')
+
+    try:
+        body, _ = await predict_cached(scope, prediction_params, max_points, encoding.JSON_MEDIA_TYPE, discount_rate)
+    except compute.Saturated as error:
+        logging.error(f"Rejected stream update: {error}")
+        STREAM_UPDATES.inc('rejected')
+        return encoding.encode_json({
+            "id": update_id, "status": 503, "error": "The server is busy, please retry later", "retry_after": cfg.compute_retry_after
+        }).decode('utf-8')
+    except Exception as error:
+        logging.error(f"Error while creating prediction data frame: {error}")
+        STREAM_UPDATES.inc('failed')
+        return encoding.encode_json({"id": update_id, "status": 500, "error": "Error while computing prediction data"}).decode('utf-8')
+
+    STREAM_UPDATES.inc('answered')
+    # the cached body is embedded as is instead of being decoded and encoded again
+    return (b'{"id":' + encoding.encode_json(update_id) + b',"status":200,"data":' + body + b'}').decode('utf-8')
+
+
+async def stream_prediction_data(websocket: WebSocket):
+    """Stream predictions for the parameter updates a client sends over a websocket.
+
+    The client authenticates once, with the Authorization header of the handshake or a first
+    message {"token": <bearer token>}. Updates are answered in order, but an update which
+    arrives while the previous one is computed replaces any update still waiting, so a client
+    dragging a slider only gets the latest state computed. Every stream holds at most one
+    waiting update and one computation, which runs in the shared compute pool.
+    """
+    global _stream_sessions
+    logging.info(f"Received stream_prediction_data connection")
+
+    if _stream_sessions >= cfg.stream_max_connections:
+        logging.error(f"Rejected stream, {_stream_sessions} streams are open")
+        await websocket.close(code=1013)
+        return
+
+    _stream_sessions += 1
+    try:
+        await websocket.accept()
+        if not websocket.user.is_authenticated:
+            try:
+                message = await asyncio.wait_for(websocket.receive_json(), cfg.stream_auth_timeout)
+                await ClientIdBearerTokenBackend().authenticate_token(message['token'])
+            except Exception as error:
+                logging.error(f"Unauthenticated stream: {error}")
+                await websocket.close(code=1008)
+                return
+        await stream_updates(websocket)
+    finally:
+        _stream_sessions -= 1
+
+
+async def stream_updates(websocket: WebSocket):
+    pending = None
+    ready = asyncio.Event()
+
+    async def answer():
+        nonlocal pending
+        while True:
+            await ready.wait()
+            ready.clear()
+            data, pending = pending, None
+            await websocket.send_text(await stream_message(websocket.scope, data))
+
+    answering = asyncio.ensure_future(answer())
+    try:
+        while not answering.done():
+            message = await asyncio.wait_for(websocket.receive(), cfg.stream_idle_timeout)
+            if message['type'] == 'websocket.disconnect':
+                return
+            data = message.get('text') or message.get('bytes') or ''
+            if len(data) > cfg.stream_max_message_bytes:
+                logging.error(f"Stream update of {len(data)} bytes exceeds the maximum of {cfg.stream_max_message_bytes}")
+                await websocket.close(code=1009)
+                return
+            STREAM_UPDATES.inc('received')
+            if pending is not None:
+                STREAM_UPDATES.inc('superseded')
+            pending = data
+            ready.set()
+    except asyncio.TimeoutError:
+        logging.info(f"Closing idle stream")
+        await websocket.close(code=1000)
+    finally:
+        answering.cancel()
+        try:
+            await answering
+        except asyncio.CancelledError:
+            pass
+        except Exception as error:
+            logging.error(f"Error while answering stream: {error}")
+
+
+async def post_prediction_batch(request: Request) -> Response:
+    logging.info(f"Received post_prediction_batch request")
+
+    if (not request.user.is_authenticated):
+        logging.error(f"Unauthenticated user: {request.user}")
+        return JSONResponse({"error": "Not authenticated"}, status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+    try:
+        with Stage(request.scope, 'parse'):
+            rows = await request.json()
+    except Exception as error:
+        logging.error(f"Invalid request body: {error}")
+        return JSONResponse({"error": "Invalid request body"}, status_code=400)
+
+    if isinstance(rows, list) and len(rows) > cfg.batch_max_size:
+        logging.error(f"Batch size {len(rows)} exceeds the maximum of {cfg.batch_max_size}")
+        return JSONResponse({"error": f"At most {cfg.batch_max_size} parameter sets are allowed"}, status_code=413)
+
+    try:
+        with Stage(request.scope, 'parse'):
+            columns = create_parameter_columns(rows)
+            ensure_valid_columns(columns)
+    except AssertionError as error:
+        logging.error(f"Invalid request parameters: {error}")
+        return JSONResponse({"error": f"Invalid request parameters: {error}"}, status_code=400)
+
+    cells = len(rows) * (columns['horizon_years'] * columns['points_per_year'] - 1)
+    if cells > cfg.batch_max_cells:
+        logging.error(f"Batch of {cells} cells exceeds the maximum of {cfg.batch_max_cells}")
+        return JSONResponse({"error": f"At most {cfg.batch_max_cells} parameter sets times points are allowed"}, status_code=413)
+
+    compute_pool = compute.pool()
+    try:
+        with compute_pool.admit():
+            with Stage(request.scope, 'compute'):
+                chunks = split_parameter_columns(columns, compute_pool.parts(cells))
+                results = await compute_pool.map(create_prediction_batch, chunks)
+            with Stage(request.scope, 'serialize'):
+                body = await compute_pool.run(encode_batch, results)
+    except compute.Saturated as error:
+        logging.error(f"Rejected prediction batch: {error}")
+        return busy_response()
+    except Exception as error:
+        logging.error(f"Error while creating prediction batch: {error}")
+        return JSONResponse({"error": "Error while computing prediction data"}, status_code=500)
+
+    logging.info(f"Returning prediction data for {len(rows)} parameter sets")
+    return Response(body, status_code=200, media_type=encoding.JSON_MEDIA_TYPE)
+
+
+def encode_batch(results: list) -> bytes:
+    """Join the results of the chunks of a batch and encode them as JSON."""
+    return encoding.encode_json(concatenate_batches(results).__dict__)
+
+
+def encode_array(array: np.ndarray) -> dict:
+    """Encode an array as base64 of its little-endian float64 values in C order."""
+    data = np.ascontiguousarray(array, dtype='<f8')
+    return {
+        "dtype": "<f8",
+        "shape": list(data.shape),
+        "data": base64.b64encode(data.tobytes()).decode('ascii')
+    }
+
+
+async def post_prediction_sweep(request: Request) -> Response:
+    logging.info(f"Received post_prediction_sweep request")
+
+    if (not request.user.is_authenticated):
+        logging.error(f"Unauthenticated user: {request.user}")
+        return JSONResponse({"error": "Not authenticated"}, status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+    try:
+        with Stage(request.scope, 'parse'):
+            body = await request.json()
+            assert isinstance(body, dict)
+    except Exception as error:
+        logging.error(f"Invalid request body: {error}")
+        return JSONResponse({"error": "Invalid request body"}, status_code=400)
+
+    year = body.get('year')
+    try:
+        with Stage(request.scope, 'parse'):
+            # the grid is only allocated once its size is known to be within the limit
+            cells = count_sweep_cells(body.get('parameters', {}), create_parameter_ranges(body.get('ranges')), year)
+    except AssertionError as error:
+        logging.error(f"Invalid request parameters: {error}")
+        return JSONResponse({"error": f"Invalid request parameters: {error}"}, status_code=400)
+
+    if cells > cfg.sweep_max_cells:
+        logging.error(f"Sweep of {cells} cells exceeds the maximum of {cfg.sweep_max_cells}")
+        return JSONResponse({"error": f"At most {cfg.sweep_max_cells} cells are allowed"}, status_code=413)
+
+    try:
+        with Stage(request.scope, 'parse'):
+            axes, columns = create_parameter_grid(body.get('parameters', {}), body.get('ranges'))
+            ensure_valid_columns(columns)
+    except AssertionError as error:
+        logging.error(f"Invalid request parameters: {error}")
+        return JSONResponse({"error": f"Invalid request parameters: {error}"}, status_code=400)
+
+    compute_pool = compute.pool()
+    try:
+        with compute_pool.admit():
+            with Stage(request.scope, 'compute'):
+                chunks = split_parameter_grid(axes, columns, compute_pool.parts(cells))
+                results = await compute_pool.map(create_prediction_sweep, *zip(*chunks), [year] * len(chunks))
+            with Stage(request.scope, 'serialize'):
+                body = await compute_pool.run(encode_sweep, results)
+    except compute.Saturated as error:
+        logging.error(f"Rejected prediction sweep: {error}")
+        return busy_response()
+    except (AssertionError, TypeError, ValueError) as error:
+        logging.error(f"Invalid request parameters: {error}")
+        return JSONResponse({"error": f"Invalid request parameters: {error}"}, status_code=400)
+    except Exception as error:
+        logging.error(f"Error while creating prediction sweep: {error}")
+        return JSONResponse({"error": "Error while computing prediction data"}, status_code=500)
+
+    logging.info(f"Returning prediction data for {cells} cells")
+    return Response(body, status_code=200, media_type=encoding.JSON_MEDIA_TYPE)
+
+
+def encode_sweep(results: list) -> bytes:
+    """Join the results of the chunks of a sweep and encode them as JSON."""
+    prediction_data = concatenate_sweeps(results)
+    return encoding.encode_json({
+        "axes": prediction_data.axes,
+        "year": prediction_data.year,
+        "cost_used_purchase": encode_array(prediction_data.cost_used_purchase),
+        "cost_new_purchase": encode_array(prediction_data.cost_new_purchase),
+        "cost_leasing": encode_array(prediction_data.cost_leasing),
+    })
+
+
+async def get_prediction_breakeven(request: Request) -> JSONResponse:
+    logging.info(f"Received get_prediction_breakeven request")
+
+    if (not request.user.is_authenticated):
+        logging.error(f"Unauthenticated user: {request.user}")
+        return JSONResponse({"error": "Not authenticated"}, status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+    try:
+        with Stage(request.scope, 'parse'):
+            query_params = dict(request.query_params)
+            years = query_params.pop('years', None)
+            if years is not None:
+                years = ensure_valid_years(years)
+            prediction_params = PredictionParameters(**query_params)
+            prediction_params.ensure_valid()
+    except Exception as error:
+        logging.error(f"Invalid request parameters: {request.query_params}")
+        return JSONResponse({"error": "Invalid request parameters"}, status_code=400)
+
+    compute_pool = compute.pool()
+    try:
+        with compute_pool.admit(), Stage(request.scope, 'compute'):
+            crossovers = await compute_pool.run(create_breakeven, prediction_params, years)
+    except compute.Saturated as error:
+        logging.error(f"Rejected breakeven: {error}")
+        return busy_response()
+    except (AssertionError, ValueError) as error:
+        logging.error(f"Invalid request parameters: {error}")
+        return JSONResponse({"error": f"Invalid request parameters: {error}"}, status_code=400)
+    except Exception as error:
+        logging.error(f"Error while computing breakeven: {error}")
+        return JSONResponse({"error": "Error while computing breakeven"}, status_code=500)
+
+    logging.info(f"Returning {len(crossovers)} crossovers")
+    with Stage(request.scope, 'serialize'):
+        return JSONResponse({"crossovers": [crossover.__dict__ for crossover in crossovers]}, status_code=200)
+
+
+async def post_prediction_optimize(request: Request) -> Response:
+    logging.info(f"Received post_prediction_optimize request")
+
+    if (not request.user.is_authenticated):
+        logging.error(f"Unauthenticated user: {request.user}")
+        return JSONResponse({"error": "Not authenticated"}, status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+    try:
+        with Stage(request.scope, 'parse'):
+            body = await request.json()
+            assert isinstance(body, dict)
+    except Exception as error:
+        logging.error(f"Invalid request body: {error}")
+        return JSONResponse({"error": "Invalid request body"}, status_code=400)
+
+    try:
+        with Stage(request.scope, 'parse'):
+            parameters = body.get('parameters', {})
+            optimize.ensure_valid_fixed(parameters)
+            ranges = body.get('ranges')
+            candidates = optimize.count_candidates(optimize.create_search_ranges(ranges))
+            years = ensure_valid_years(body.get('years', PredictionParameters.horizon_years))
+            top = int(body.get('top', 5))
+    except (AssertionError, TypeError, ValueError) as error:
+        logging.error(f"Invalid request parameters: {error}")
+        return JSONResponse({"error": f"Invalid request parameters: {error}"}, status_code=400)
+
+    if candidates > cfg.optimize_max_candidates:
+        logging.error(f"Optimization of {candidates} candidates exceeds the maximum of {cfg.optimize_max_candidates}")
+        return JSONResponse({"error": f"At most {cfg.optimize_max_candidates} candidates are allowed"}, status_code=413)
+
+    compute_pool = compute.pool()
+    try:
+        with compute_pool.admit(), Stage(request.scope, 'compute'):
+            result = await compute_pool.run(optimize.optimize, parameters, ranges, years, top)
+    except compute.Saturated as error:
+        logging.error(f"Rejected optimization: {error}")
+        return busy_response()
+    except AssertionError as error:
+        logging.error(f"Invalid request parameters: {error}")
+        return JSONResponse({"error": f"Invalid request parameters: {error}"}, status_code=400)
+    except Exception as error:
+        logging.error(f"Error while optimizing: {error}")
+        return JSONResponse({"error": "Error while optimizing"}, status_code=500)
+
+    logging.info(f"Returning optimization of {result.evaluated} evaluated and {result.pruned} pruned candidates")
+    with Stage(request.scope, 'serialize'):
+        return JSONResponse(dataclasses.asdict(result), status_code=200)
+
+
+async def post_prediction_montecarlo(request: Request) -> Response:
+    logging.info(f"Received post_prediction_montecarlo request")
+
+    if (not request.user.is_authenticated):
+        logging.error(f"Unauthenticated user: {request.user}")
+        return JSONResponse({"error": "Not authenticated"}, status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+    try:
+        with Stage(request.scope, 'parse'):
+            body = await request.json()
+            assert isinstance(body, dict)
+    except Exception as error:
+        logging.error(f"Invalid request body: {error}")
+        return JSONResponse({"error": "Invalid request body"}, status_code=400)
+
+    try:
+        prediction_params = PredictionParameters(**body.get('parameters', {}))
+        distributions = body.get('distributions')
+        if distributions is None:
+            distributions = montecarlo.DEFAULT_DISTRIBUTIONS
+        else:
+            distributions = {name: montecarlo.Distribution(**value) for name, value in distributions.items()}
+        paths = int(body.get('paths', 10000))
+        seed = int(body.get('seed', 0))
+        percentiles = body.get('percentiles', list(montecarlo.PERCENTILES))
+        assert isinstance(percentiles, list), "percentiles must be a list"
+        cells = montecarlo.count_cells(prediction_params, paths)
+    except Exception as error:
+        logging.error(f"Invalid request parameters: {error}")
+        return JSONResponse({"error": "Invalid request parameters"}, status_code=400)
+
+    if paths > cfg.monte_carlo_max_paths:
+        logging.error(f"Simulation of {paths} paths exceeds the maximum of {cfg.monte_carlo_max_paths}")
+        return JSONResponse({"error": f"At most {cfg.monte_carlo_max_paths} paths are allowed"}, status_code=413)
+
+    if cells > cfg.monte_carlo_max_cells:
+        logging.error(f"Simulation of {cells} cells exceeds the maximum of {cfg.monte_carlo_max_cells}")
+        return JSONResponse({"error": f"At most {cfg.monte_carlo_max_cells} paths times points are allowed"}, status_code=413)
+
+    compute_pool = compute.pool()
+    try:
+        with compute_pool.admit():
+            with Stage(request.scope, 'compute'):
+                # the paths are sampled once off the event loop and shared by the blocks
+                year, month, percentiles, blocks = await compute_pool.run(
+                    montecarlo.split_simulation,
+                    prediction_params,
+                    distributions,
+                    paths,
+                    seed,
+                    percentiles,
+                    cfg.monte_carlo_block_cells
+                )
+                # the blocks of one simulation are distributed over its share of the workers of the pool
+                results = await compute_pool.map(montecarlo.simulate_block, *zip(*blocks), limit=compute_pool.parts(cells))
+                simulation = montecarlo.join_simulation(year, month, percentiles, results)
+            with Stage(request.scope, 'serialize'):
+                body = await compute_pool.run(encoding.encode_json, simulation.__dict__)
+    except compute.Saturated as error:
+        logging.error(f"Rejected simulation: {error}")
+        return busy_response()
+    except (AssertionError, TypeError, ValueError) as error:
+        logging.error(f"Invalid request parameters: {error}")
+        return JSONResponse({"error": f"Invalid request parameters: {error}"}, status_code=400)
+    except Exception as error:
+        logging.error(f"Error while simulating prediction: {error}")
+        return JSONResponse({"error": "Error while computing prediction data"}, status_code=500)
+
+    logging.info(f"Returning simulated prediction data of {paths} paths")
+    return Response(body, status_code=200, media_type=encoding.JSON_MEDIA_TYPE)
@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import sys
+# the core package is shared between the api and the app
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 from starlette.applications import Starlette
 from starlette.middleware import Middleware
 from starlette.middleware.cors import CORSMiddleware
@@ -8,23 +13,57 @@ from starlette.middleware.authentication import AuthenticationMiddleware
 import uvicorn
 import logging
 from auth import ClientIdBearerTokenBackend
+from metrics import MetricsMiddleware
+from limits import LimitMiddleware
+import prefork
 
 import router
+import compute
 import cfg
 
 cfg.load()
 
 logging.basicConfig(level=logging.INFO if cfg.debug else logging.WARNING)
 
+middleware = [
+    Middleware(CORSMiddleware, allow_origins=cfg.origin, allow_methods=['*'], allow_headers=['*']),
+    Middleware(AuthenticationMiddleware, backend=ClientIdBearerTokenBackend()),
+    # innermost, so rate limits apply per client and rejected requests are answered before any route runs
+    Middleware(LimitMiddleware, rate=cfg.rate_limit, burst=cfg.rate_limit_burst, max_concurrent=cfg.max_concurrent_requests)
+]
+if cfg.metrics or cfg.server_timing:
+    # outermost, so the timings include the other middlewares
+    middleware.insert(0, Middleware(MetricsMiddleware, record=cfg.metrics, server_timing=cfg.server_timing))
+
 app = Starlette(
     debug=cfg.debug,
     routes=[router.api_routes],
-    middleware=[
-        Middleware(CORSMiddleware, allow_origins=cfg.origin, allow_methods=['*'], allow_headers=['*']),
-        Middleware(AuthenticationMiddleware, backend=ClientIdBearerTokenBackend())
-    ]
+    middleware=middleware,
+    on_shutdown=[compute.shutdown]
 )
 
+def warm_up():
+    """Import the lazily loaded routes and run a prediction once, before the workers are forked."""
+    import routes.metrics.route
+    import routes.prediction.route
+    routes.prediction.route.warm_up()
+
+
 if __name__ == "__main__":
     logging.info(f"Starting server on {cfg.host}:{cfg.port}")
-    uvicorn.run("server:app", reload=True, port=cfg.port, host=cfg.host, log_level="info" if cfg.debug else "warning")
+    if cfg.debug:
+        uvicorn.run("server:app", reload=True, port=cfg.port, host=cfg.host, log_level="info")
+    else:
+        config = uvicorn.Config(
+            app,
+            host=cfg.host,
+            port=cfg.port,
+            loop=cfg.loop,
+            http=cfg.http,
+            backlog=cfg.backlog,
+            timeout_keep_alive=cfg.keep_alive_timeout,
+            timeout_graceful_shutdown=cfg.graceful_shutdown_timeout,
+            ws_max_size=cfg.stream_max_message_bytes,
+            log_level="warning"
+        )
+        prefork.serve(config, cfg.workers, warm_up)
@@ -0,0 +1,36 @@
+import asyncio
+import typing as t
+
+class SingleFlight:
+    """Coalesce concurrent computations of the same key into one.
+
+    The first caller of a key starts the computation, callers arriving while it is in flight
+    wait for the same result or error. Nothing is kept once the computation completes, so this
+    complements a cache instead of replacing it. The computation runs as its own task, so a
+    cancelled caller does not cancel it for the others. Only used from the event loop.
+    """
+    def __init__(self):
+        self.leaders = 0
+        self.shared = 0
+        self._flights: t.Dict[t.Hashable, asyncio.Task] = {}
+
+    async def do(self, key: t.Hashable, fn: t.Callable[[], t.Awaitable]) -> t.Any:
+        """Return the result of fn, or of the computation of the same key already in flight."""
+        task = self._flights.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+
+            def done(task: asyncio.Task):
+                self._flights.pop(key, None)
+                # retrieve the error, so it is not reported as unhandled if every caller was cancelled
+                if not task.cancelled():
+                    task.exception()
+            task.add_done_callback(done)
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._flights)
@@ -0,0 +1,70 @@
+import asyncio
+import base64
+import concurrent.futures
+import threading
+import typing as t
+import httpx
+
+import cfg
+
+_loop: asyncio.AbstractEventLoop = None
+_client: httpx.AsyncClient = None
+_in_flight: t.Dict[str, asyncio.Task] = {}
+_lock = threading.Lock()
+
+def _start_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="api-client", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def client() -> httpx.AsyncClient:
+    """The pooled client of the API, shared by all callbacks.
+
+    Must only be used from coroutines passed to run, which all execute on the same
+    long lived event loop, so keep-alive connections are reused across callbacks.
+    """
+    global _client
+    if _client is None:
+        token = base64.b64encode(cfg.client_id.encode("utf-8")).decode("utf-8")
+        _client = httpx.AsyncClient(
+            base_url=cfg.api_endpoint,
+            headers={"Authorization": f"Bearer {token}"},
+            limits=httpx.Limits(
+                max_connections=cfg.api_max_connections,
+                max_keepalive_connections=cfg.api_max_keepalive_connections,
+                keepalive_expiry=cfg.api_keepalive_expiry,
+            ),
+            timeout=cfg.api_timeout,
+        )
+    return _client
+
+
+async def _run_latest(session: t.Optional[str], coro: t.Awaitable) -> t.Any:
+    task = asyncio.ensure_future(coro)
+    if session is not None:
+        previous = _in_flight.get(session)
+        if previous is not None and not previous.done():
+            previous.cancel()
+        _in_flight[session] = task
+    try:
+        return await task
+    finally:
+        if session is not None and _in_flight.get(session) is task:
+            del _in_flight[session]
+
+
+def run(coro: t.Awaitable, session: t.Optional[str] = None) -> t.Any:
+    """Run a coroutine on the event loop of the API client and wait for its result.
+
+    @param coro: The coroutine, which may use client().
+    @param session: If given, only the latest coroutine of the session runs to completion.
+        A coroutine still in flight when a newer one of the same session arrives is
+        cancelled, and run raises concurrent.futures.CancelledError for it.
+    """
+    future: concurrent.futures.Future = asyncio.run_coroutine_threadsafe(_run_latest(session, coro), _start_loop())
+    return future.result()
@@ -6,6 +6,15 @@ debug: bool
 origin: list
 host: str
 port: int
+backend: str
+api_endpoint: str
+api_max_connections: int
+api_max_keepalive_connections: int
+api_keepalive_expiry: float
+api_timeout: float
+graph_max_points: int
+input_debounce: float
+monte_carlo_paths: int
 
 def load():
     global client_id
@@ -13,7 +22,15 @@ def load():
     global origin
     global host
     global port
+    global backend
     global api_endpoint
+    global api_max_connections
+    global api_max_keepalive_connections
+    global api_keepalive_expiry
+    global api_timeout
+    global graph_max_points
+    global input_debounce
+    global monte_carlo_paths
 
     load_dotenv()
     client_id = os.getenv('CAR_CLIENT_ID')
@@ -32,5 +49,30 @@ def load():
     assert host, "A host must be specified in the APP_ENDPOINT environment variable"
     assert port, "A port must be specified in the APP_ENDPOINT environment variable"
 
+    backend = os.getenv('BACKEND', 'remote')
+    assert backend in ('remote', 'local'), "The BACKEND environment variable must be either remote or local"
+
     api_endpoint = os.getenv('API_ENDPOINT', 'http://127.0.0.1:3000')
     assert api_endpoint, "A api endpoint must be specified in the API_ENDPOINT environment variable"
+
+    api_max_connections = int(os.getenv('API_MAX_CONNECTIONS', 32))
+    assert api_max_connections > 0, "The API_MAX_CONNECTIONS environment variable must be greater than 0"
+
+    api_max_keepalive_connections = int(os.getenv('API_MAX_KEEPALIVE_CONNECTIONS', 16))
+    assert api_max_keepalive_connections >= 0, "The API_MAX_KEEPALIVE_CONNECTIONS environment variable must be greater than or equal to 0"
+
+    api_keepalive_expiry = float(os.getenv('API_KEEPALIVE_EXPIRY', 30))
+    assert api_keepalive_expiry >= 0, "The API_KEEPALIVE_EXPIRY environment variable must be greater than or equal to 0"
+
+    api_timeout = float(os.getenv('API_TIMEOUT', 10))
+    assert api_timeout > 0, "The API_TIMEOUT environment variable must be greater than 0"
+
+    graph_max_points = int(os.getenv('GRAPH_MAX_POINTS', 2000))
+    assert graph_max_points >= 8, "The GRAPH_MAX_POINTS environment variable must be greater than or equal to 8"
+
+    # the seconds a number input waits for typing to stop before updating the graph, 0 updates on every change
+    input_debounce = float(os.getenv('INPUT_DEBOUNCE', 0.3))
+    assert input_debounce >= 0, "The INPUT_DEBOUNCE environment variable must be greater than or equal to 0"
+
+    monte_carlo_paths = int(os.getenv('MONTE_CARLO_PATHS', 2000))
+    assert monte_carlo_paths > 0, "The MONTE_CARLO_PATHS environment variable must be greater than 0"
@@ -1,13 +1,20 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import sys
+# the core package is shared between the api and the app
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 from dash import Dash, html, dcc, callback, clientside_callback, ClientsideFunction, Output, Input
 import dash_mantine_components as dmc
 import cfg
-import layouter
 
+# the layouts read the configuration when layouter is imported
 cfg.load()
 
+import layouter
+
 def external_stylesheets():
     return [
         {
@@ -1,8 +1,17 @@
-from dash import html, dcc, callback, Output, Input
+from dash import html, dcc, callback, clientside_callback, ctx, Output, Input, State, Patch
+from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
+import numpy as np
 import asyncio
+import concurrent.futures
+import hashlib
 
-from layouts.prediction.service import PredictionParameters, get_prediction_data
+import api_client
+import cfg
+
+from layouts.prediction.service import (
+    PredictionParameters, get_prediction_data, get_breakeven_data, get_montecarlo_data
+)
 
 leasing_cost_per_month = 315
 leasing_switch_cost = 500
@@ -13,9 +22,97 @@ purchase_used_price = 22000
 purchase_used_age = 2
 repair_cost_per_year = 1500
 repair_free_years = 3
+horizon_years = 30
+points_per_year = 2
+
+strategy_names = {
+    'cost_used_purchase': 'Gebrauchtwagenkauf',
+    'cost_new_purchase': 'Neuwagenkauf',
+    'cost_leasing': 'Leasing',
+}
+strategy_colors = {
+    'cost_used_purchase': (99, 110, 250),
+    'cost_new_purchase': (239, 85, 59),
+    'cost_leasing': (0, 204, 150),
+}
+
+# a random id per page load, so only the latest graph update of each page is computed
+clientside_callback(
+    """
+    function(id) {
+        return window.crypto.randomUUID ? window.crypto.randomUUID() : Math.random().toString(36).slice(2);
+    }
+    """,
+    Output('prediction_session', 'data'),
+    Input('prediction_session', 'id')
+)
+
+# the traces of the figure by index, the figure is created once in the layout and only patched afterwards
+curve_traces = {name: index for index, name in enumerate(strategy_names)}
+band_traces = {name: (3 + 2 * index, 4 + 2 * index) for index, name in enumerate(strategy_names)}
+crossover_trace = 9
+
+
+def initial_figure() -> go.Figure:
+    """The figure without data, with every trace and the layout the updates patch."""
+    fig = go.Figure(layout={'uirevision': 'prediction'})
+    for name in strategy_names:
+        fig.add_trace(go.Scatter(
+            x=[],
+            y=[],
+            name=strategy_names[name],
+            line={'color': 'rgb({}, {}, {})'.format(*strategy_colors[name])}
+        ))
+    # shade the area between the lowest and the highest percentile of each strategy
+    for name in strategy_names:
+        fig.add_trace(go.Scatter(
+            x=[],
+            y=[],
+            mode='lines',
+            line={'width': 0},
+            hoverinfo='skip',
+            showlegend=False,
+            visible=False
+        ))
+        fig.add_trace(go.Scatter(
+            x=[],
+            y=[],
+            mode='lines',
+            line={'width': 0},
+            fill='tonexty',
+            fillcolor='rgba({}, {}, {}, 0.2)'.format(*strategy_colors[name]),
+            name=strategy_names[name],
+            hoverinfo='skip',
+            visible=False
+        ))
+    fig.add_trace(go.Scatter(
+        x=[],
+        y=[],
+        text=[],
+        hoverinfo='text',
+        mode='markers',
+        marker={'symbol': 'x', 'size': 10},
+        name='Gewinnschwelle'
+    ))
+    return fig
+
+
+def digest(values) -> str:
+    return hashlib.blake2b(np.ascontiguousarray(values, dtype=np.float64).tobytes(), digest_size=16).hexdigest()
+
+
+def time_axis_properties(year: np.ndarray) -> dict:
+    """The properties of a curve trace for the time axis, only the start and step if the axis is uniform."""
+    if len(year) > 1:
+        step = year[1] - year[0]
+        if np.allclose(np.diff(year), step):
+            return {'x': None, 'x0': year[0], 'dx': step}
+    return {'x': year, 'x0': None, 'dx': None}
+
 
 @callback(
     Output('graph-content', 'figure'),
+    Output('prediction_sent', 'data'),
     Input('slider_purchase_years', 'value'),
     Input('input_purchase_new_price', 'value'),
     Input('input_purchase_used_price', 'value'),
@@ -24,7 +121,12 @@ repair_free_years = 3
     Input('slider_leasing_years', 'value'),
     Input('input_repair_cost_per_year', 'value'),
     Input('slider_repair_free_years', 'value'),
-    Input('slider_purchase_used_age', 'value')
+    Input('slider_purchase_used_age', 'value'),
+    Input('slider_horizon_years', 'value'),
+    Input('dropdown_points_per_year', 'value'),
+    Input('checklist_uncertainty', 'value'),
+    State('prediction_session', 'data'),
+    State('prediction_sent', 'data')
 )
 def update_graph(
     purchase_years,
@@ -35,41 +137,118 @@ def update_graph(
     leasing_years,
     repair_cost_per_year,
     repair_free_years,
-    purchase_used_age
-) -> go.Figure:
+    purchase_used_age,
+    horizon_years,
+    points_per_year,
+    uncertainty,
+    session,
+    sent
+) -> tuple:
     try:
         params = PredictionParameters(
-            purchase_years,
-            purchase_new_price,
-            purchase_used_price,
-            leasing_cost_per_month,
-            leasing_switch_cost,
-            leasing_years,
-            repair_cost_per_year,
-            repair_free_years,
-            purchase_used_age
+            purchase_years=purchase_years,
+            purchase_new_price=purchase_new_price,
+            purchase_used_price=purchase_used_price,
+            purchase_used_age=purchase_used_age,
+            leasing_cost_per_month=leasing_cost_per_month,
+            leasing_switch_cost=leasing_switch_cost,
+            leasing_years=leasing_years,
+            repair_cost_per_year=repair_cost_per_year,
+            repair_free_years=repair_free_years,
+            horizon_years=horizon_years,
+            points_per_year=points_per_year
         )
         params.ensure_valid()
     except Exception:
-        return None
+        return initial_figure(), {}
+
+    return patch_graph(params, uncertainty, session, sent, set(ctx.triggered_prop_ids.values()))
+
+
+def patch_graph(params: PredictionParameters, uncertainty, session, sent, triggered: set) -> tuple:
+    """Update the figure with the data which changed since the last update of the page.
+
+    The browser keeps the figure, so instead of a new figure only the arrays which differ from
+    the ones sent before are patched into it. Which arrays were sent is tracked by their digests.
+
+        @param sent: The digests of the arrays in the figure, as returned by the last update.
+        @param triggered: The ids of the inputs which changed, empty for the initial update.
+        @return: A tuple (patch, sent) with the patch of the figure and the digests after it.
+    """
+    sent = dict(sent or {})
+    show_bands = 'bands' in (uncertainty or [])
+    # toggling the uncertainty does not change the curves
+    bands_only = triggered == {'checklist_uncertainty'}
+
+    async def get_graph_data():
+        async def skip():
+            return None
+
+        return await asyncio.gather(
+            skip() if bands_only else get_prediction_data(params),
+            skip() if bands_only else get_breakeven_data(params),
+            get_montecarlo_data(params) if show_bands else skip(),
+            return_exceptions=True
+        )
 
     try:
-        data = asyncio.run(get_prediction_data(params))
-    except Exception:
-        return None
+        data, crossovers, bands = api_client.run(get_graph_data(), session)
+    except concurrent.futures.CancelledError:
+        # superseded by a newer update of the same page
+        raise PreventUpdate
+    if isinstance(data, Exception):
+        return initial_figure(), {}
 
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=data.year, y=data.cost_used_purchase, name='Gebrauchtwagenkauf'))
-    fig.add_trace(go.Scatter(x=data.year, y=data.cost_new_purchase, name='Neuwagenkauf'))
-    fig.add_trace(go.Scatter(x=data.year, y=data.cost_leasing, name='Leasing'))
+    fig = Patch()
+    if data is not None:
+        year = np.asarray(data.year)
+        year_digest = digest(year)
+        if sent.get('year') != year_digest:
+            for index in curve_traces.values():
+                fig['data'][index].update(time_axis_properties(year))
+            sent['year'] = year_digest
+        for name, index in curve_traces.items():
+            curve_digest = digest(getattr(data, name))
+            if sent.get(name) != curve_digest:
+                fig['data'][index]['y'] = getattr(data, name)
+                sent[name] = curve_digest
 
-    return fig
+    if not show_bands or isinstance(bands, Exception):
+        if sent.pop('bands', False):
+            for upper, lower in band_traces.values():
+                fig['data'][lower].update({'x': [], 'y': [], 'visible': False})
+                fig['data'][upper].update({'x': [], 'y': [], 'visible': False})
+    else:
+        for name, (upper, lower) in band_traces.items():
+            percentiles = getattr(bands, name)
+            fig['data'][upper].update({'x': bands.year, 'y': percentiles[-1], 'visible': True})
+            fig['data'][lower].update({
+                'x': bands.year,
+                'y': percentiles[0],
+                'visible': True,
+                'name': f"{strategy_names[name]} P{bands.percentiles[0]:g}-P{bands.percentiles[-1]:g}"
+            })
+        sent['bands'] = True
+
+    if crossovers is not None:
+        if isinstance(crossovers, Exception):
+            fig['data'][crossover_trace]['visible'] = False
+        else:
+            fig['data'][crossover_trace].update({
+                'x': [crossover.year for crossover in crossovers],
+                'y': [crossover.cost for crossover in crossovers],
+                'text': [f"{strategy_names[crossover.cheaper]} günstiger ab {crossover.year:.2f} Jahren" for crossover in crossovers],
+                'visible': True
+            })
+
+    return fig, sent
 
 
 def layout():
     # number input leasing_cost_per_month from 100 to 1000 in steps of 10
     input_leasing_cost_per_month = dcc.Input(
         type='number',
+        debounce=cfg.input_debounce,
         min=100,
         max=5000,
         step=5,
@@ -79,6 +258,7 @@ def layout():
     # leasing_switch_cost from 0 to 1000 in steps of 100
     input_leasing_switch_cost = dcc.Input(
         type='number',
+        debounce=cfg.input_debounce,
         min=0,
         max=10000,
         step=100,
@@ -106,6 +286,7 @@ def layout():
     # repair_cost_per_year from 0 to 5000 in steps of 100
     input_repair_cost_per_year = dcc.Input(
         type='number',
+        debounce=cfg.input_debounce,
         min=0,
         max=10000,
         step=100,
@@ -124,6 +305,7 @@ def layout():
     # purchase_new_price from 10000 to 100000 in steps of 1000
     input_purchase_new_price = dcc.Input(
         type='number',
+        debounce=cfg.input_debounce,
         min=10000,
         max=4000000,
         step=1000,
@@ -133,6 +315,7 @@ def layout():
     # purchase_used_price from 10000 to 100000 in steps of 1000
     input_purchase_used_price = dcc.Input(
         type='number',
+        debounce=cfg.input_debounce,
         min=10000,
         max=4000000,
         step=1000,
@@ -149,6 +332,33 @@ def layout():
         id='slider_purchase_used_age'
     )
 
+    # horizon_years from 10 to 50 in steps of 5
+    slider_horizon_years = dcc.Slider(
+        min=10,
+        max=50,
+        step=5,
+        value=horizon_years,
+        marks={i: str(i) for i in range(10, 50+1, 10)},
+        id='slider_horizon_years'
+    )
+    # points_per_year half-yearly, monthly or daily
+    dropdown_points_per_year = dcc.Dropdown(
+        options=[
+            {'label': 'Halbjährlich', 'value': 2},
+            {'label': 'Monatlich', 'value': 12},
+            {'label': 'Täglich', 'value': 365},
+        ],
+        value=points_per_year,
+        clearable=False,
+        id='dropdown_points_per_year'
+    )
+
+    checklist_uncertainty = dcc.Checklist(
+        options=[{'label': 'Unsicherheit anzeigen', 'value': 'bands'}],
+        value=[],
+        id='checklist_uncertainty'
+    )
+
     def slider_wrapper(slider):
         return html.Div(slider, className='outline')
 
@@ -216,9 +426,27 @@ def layout():
                     ),
                 ],
                     className='grid'),
+                    html.H2('Zeitraum'),
+                html.Div([
+                    html.Label(
+                        ['Zeitraum in Jahren', slider_wrapper(slider_horizon_years)],
+                        htmlFor='slider_horizon_years',
+                    ),
+                    html.Label(
+                        ['Auflösung', dropdown_points_per_year],
+                        htmlFor='dropdown_points_per_year',
+                    ),
+                    html.Label(
+                        ['Unsicherheit', checklist_uncertainty],
+                        htmlFor='checklist_uncertainty',
+                    ),
+                ],
+                    className='grid'),
             ],
             ),
-            dcc.Graph(id='graph-content'),
+            dcc.Graph(id='graph-content', figure=initial_figure()),
+            dcc.Store(id='prediction_session', storage_type='memory'),
+            dcc.Store(id='prediction_sent', storage_type='memory', data={}),
         ],
         className='container',
     )
@@ -0,0 +1,236 @@
+import numpy as np
+
+from core.prediction.model import HORIZON_YEARS, POINTS_PER_YEAR
+
+# the version of the cost model, must change whenever a change of the engine changes its results
+ENGINE_VERSION = '3'
+
+def time_axis(horizon_years: int = HORIZON_YEARS, points_per_year: int = POINTS_PER_YEAR) -> tuple:
+    """Create the numeric time axis of the prediction.
+
+        @param horizon_years: The number of years the time axis spans, exclusive.
+        @param points_per_year: The number of points per year.
+        @return: A tuple of arrays (year, month).
+            - year: The time axis in years, the multiples of 1 / points_per_year within the
+              horizon, by default in half-year steps from 0.5 to 29.5.
+            - month: The same time axis in months.
+    """
+    year = np.arange(1, horizon_years * points_per_year) / points_per_year
+    month = year * 12
+    return year, month
+
+
+def cost_purchase(month, price, purchase_years, initial_years, repair_free_years, repair_cost_per_year) -> np.ndarray:
+    """Compute the absolute cost of purchasing cars at the given times.
+
+    All arguments broadcast against each other, so the function evaluates a single
+    scenario over a time axis as well as many scenarios at once.
+
+    @param month: The time in months.
+    @param price: The price of a car.
+    @param purchase_years: The number of years the car is used.
+    @param initial_years: The age of the car in years at the time of purchase.
+    @param repair_free_years: The number of years a car is free of repair.
+    @param repair_cost_per_year: The cost of repairing a car per year.
+    """
+    period = np.subtract(purchase_years, initial_years) * 12
+    if np.any(period == 0):
+        raise ZeroDivisionError("purchase_years must be greater than the age of the car")
+    car_count = month // period + 1
+    car_age_months = month % period
+
+    cost = car_count * price
+
+    car_repairfree_months = np.maximum(0, np.subtract(repair_free_years, initial_years)) * 12
+    repair_months = np.maximum(0, period - car_repairfree_months) * (car_count - 1)
+    repair_months = repair_months + np.maximum(0, car_age_months - car_repairfree_months)
+    cost_repair = repair_months * repair_cost_per_year / 12
+
+    return cost + cost_repair
+
+
+def cost_leasing(month, leasing_years, leasing_switch_cost, leasing_cost_per_month) -> np.ndarray:
+    """Compute the absolute cost of leasing cars at the given times.
+
+    All arguments broadcast against each other.
+
+    @param month: The time in months.
+    @param leasing_years: The number of years a car is leased.
+    @param leasing_switch_cost: The cost of switching a car.
+    @param leasing_cost_per_month: The cost of leasing a car per month.
+    """
+    period = np.multiply(leasing_years, 12)
+    if np.any(period == 0):
+        raise ZeroDivisionError("leasing_years must be greater than 0")
+    car_count = (month - 1) // period + 1
+    switch_cost = car_count * leasing_switch_cost
+    rate_cost = month * leasing_cost_per_month
+    return switch_cost + rate_cost
+
+
+# the cost curves in the order of predict, mapped to the parameters each curve depends on
+CURVE_FIELDS = {
+    'cost_used_purchase': ('purchase_used_price', 'purchase_years', 'purchase_used_age', 'repair_free_years', 'repair_cost_per_year'),
+    'cost_new_purchase': ('purchase_new_price', 'purchase_years', 'repair_free_years', 'repair_cost_per_year'),
+    'cost_leasing': ('leasing_cost_per_month', 'leasing_switch_cost', 'leasing_years'),
+}
+
+def predict_curve(name: str, month, params) -> np.ndarray:
+    """Compute one cost curve of the prediction at the given times, see predict.
+
+    @param name: The name of the curve, one of CURVE_FIELDS. Only the parameters listed
+        for the curve are read.
+    """
+    if name == 'cost_used_purchase':
+        return cost_purchase(
+            month,
+            params['purchase_used_price'],
+            params['purchase_years'],
+            params['purchase_used_age'],
+            params['repair_free_years'],
+            params['repair_cost_per_year']
+        )
+    if name == 'cost_new_purchase':
+        return cost_purchase(
+            month,
+            params['purchase_new_price'],
+            params['purchase_years'],
+            0,
+            params['repair_free_years'],
+            params['repair_cost_per_year']
+        )
+    if name == 'cost_leasing':
+        return cost_leasing(
+            month,
+            params['leasing_years'],
+            params['leasing_switch_cost'],
+            params['leasing_cost_per_month']
+        )
+    raise KeyError(f"Unknown cost curve {name}")
+
+
+def predict(month, params) -> tuple:
+    """Compute all cost curves of the prediction at the given times.
+
+    @param month: The time in months.
+    @param params: A mapping of the prediction parameter names to scalars or arrays.
+        Arrays broadcast against the time axis, e.g. a column of shape (n, 1) with a
+        time axis of shape (m,) evaluates n scenarios at m times.
+    @return: A tuple of arrays (cost_used_purchase, cost_new_purchase, cost_leasing).
+    """
+    return tuple(predict_curve(name, month, params) for name in CURVE_FIELDS)
+
+
+def purchase_breakpoints(horizon, purchase_years, initial_years, repair_free_years) -> np.ndarray:
+    """Months in (0, horizon) at which the purchase cost jumps or changes its slope.
+
+    A new car is bought at the end of every usage period, and repairs start to accrue
+    once the car leaves its repair free years.
+
+    @param horizon: The end of the time span in months.
+    @param purchase_years: The number of years the car is used.
+    @param initial_years: The age of the car in years at the time of purchase.
+    @param repair_free_years: The number of years a car is free of repair.
+    """
+    period = (purchase_years - initial_years) * 12
+    assert period > 0, "purchase_years must be greater than the age of the car"
+    car_repairfree_months = max(0, repair_free_years - initial_years) * 12
+    purchases = np.arange(0, horizon, period, dtype=np.float64)
+    repairs = purchases + car_repairfree_months if car_repairfree_months < period else purchases[:0]
+    breakpoints = np.concatenate((purchases[1:], repairs))
+    return breakpoints[(breakpoints > 0) & (breakpoints < horizon)]
+
+
+def purchase_slope(month, purchase_years, initial_years, repair_free_years, repair_cost_per_year) -> np.ndarray:
+    """The cost per month of purchasing cars right after the given times."""
+    period = (purchase_years - initial_years) * 12
+    car_repairfree_months = max(0, repair_free_years - initial_years) * 12
+    repairing = month % period >= car_repairfree_months
+    return np.where(repairing, repair_cost_per_year / 12, 0.0)
+
+
+def leasing_breakpoints(horizon, leasing_years) -> np.ndarray:
+    """Months in (0, horizon) at which the leasing cost jumps for a car switch."""
+    period = leasing_years * 12
+    assert period > 0, "leasing_years must be greater than 0"
+    return np.arange(1, horizon, period, dtype=np.float64)
+
+
+def leasing_slope(month, leasing_cost_per_month) -> np.ndarray:
+    """The cost per month of leasing cars right after the given times."""
+    return np.full(np.shape(month), leasing_cost_per_month, dtype=np.float64)
+
+
+def find_crossovers(start, end, difference, slope) -> tuple:
+    """Find the times at which a piecewise linear difference of two costs changes its sign.
+
+    The difference is linear on each segment [start, end) and may jump at the segment
+    boundaries. Every segment is visited once, so the cost is linear in the number of
+    segments regardless of the length of the time span.
+
+    @param start: The start of each segment in months, ascending.
+    @param end: The end of each segment in months, equal to the start of the next segment.
+    @param difference: The difference at the start of each segment.
+    @param slope: The slope of the difference on each segment.
+    @return: A tuple of arrays (month, sign), with the strictly ascending times of the
+        crossovers and the sign of the difference right after each crossover.
+    """
+    # interleave the values at the start and right before the end of each segment
+    values = np.empty(2 * len(start))
+    values[0::2] = difference
+    values[1::2] = difference + slope * (end - start)
+    positions = np.empty(2 * len(start))
+    positions[0::2] = start
+    positions[1::2] = end
+
+    nonzero = np.flatnonzero(values)
+    signs = np.sign(values[nonzero])
+    changes = np.flatnonzero(signs[1:] != signs[:-1])
+    before, after = nonzero[changes], nonzero[changes + 1]
+
+    # a sign change between the start and end of a segment is a root of the linear part,
+    # otherwise the curves meet at the first point after the last nonzero difference
+    linear = (after == before + 1) & (before % 2 == 0)
+    month = positions[before + 1].copy()
+    segment = before[linear] // 2
+    root = start[segment] - difference[segment] / slope[segment]
+    # a root rounded onto the end of its segment coincides with a jump at the end
+    month[linear] = np.where(np.isclose(root, end[segment], rtol=1e-12, atol=0), end[segment], root)
+    signs = signs[changes + 1]
+
+    # the sign alternates, so crossovers at the same time cancel in pairs, an odd number of
+    # them is a single crossover with the sign after the last
+    first = np.flatnonzero(np.r_[True, month[1:] != month[:-1]])
+    last = np.r_[first[1:], month.size] - 1
+    single = last[(last - first) % 2 == 0]
+    return month[single], signs[single]
+
+
+def downsample(columns, max_points: int) -> np.ndarray:
+    """Select the points of a time axis to keep the shape of the series on it when plotted.
+
+    The interior points are split into equally sized buckets, and the minimum and maximum of
+    every series is kept per bucket, together with the first and last point. Jumps and
+    extrema survive, which is not the case when only every n-th point is kept.
+
+    @param columns: The series, each of the same length as the time axis.
+    @param max_points: The maximum number of points to keep, at least 2.
+    @return: The ascending indices of the points to keep.
+    """
+    columns = [np.asarray(column, dtype=np.float64) for column in columns]
+    points = columns[0].size
+    if points <= max_points:
+        return np.arange(points)
+    buckets = max(1, (max_points - 2) // (2 * len(columns)))
+    size = -(-(points - 2) // buckets)
+    # with the rounded up bucket size fewer buckets may suffice, so none consists of padding only
+    buckets = -(-(points - 2) // size)
+    offsets = np.arange(buckets) * size + 1
+    indices = [np.array([0, points - 1])]
+    for column in columns:
+        interior = np.full(buckets * size, np.nan)
+        interior[:points - 2] = column[1:-1]
+        interior = interior.reshape(buckets, size)
+        indices.append(offsets + np.nanargmin(interior, axis=1))
+        indices.append(offsets + np.nanargmax(interior, axis=1))
+    return np.unique(np.concatenate(indices))
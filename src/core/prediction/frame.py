@@ -0,0 +1,54 @@
+"""A compact binary encoding of a PredictionResult.
+
+The frame starts with a little-endian header:
+    - magic: The bytes b'CRF1'.
+    - version: The version of the format, currently 1.
+    - flags: Bit 0 is set if the year axis is sent as a column.
+    - points: The number of points of each column.
+    - first: The index of the first point on the time axis.
+    - divisor: The number of points per year on the time axis.
+The header is followed by the columns as packed little-endian float64 values: the year axis
+if flag bit 0 is set, then cost_used_purchase, cost_new_purchase and cost_leasing. Otherwise
+the year axis is (first + i) / divisor for the i-th point. The month axis is always 12 times
+the year axis.
+"""
+import struct
+import numpy as np
+
+from core.prediction.model import PredictionResult
+
+MEDIA_TYPE = 'application/vnd.car-roi.f64'
+MAGIC = b'CRF1'
+VERSION = 1
+FLAG_YEAR = 1
+HEADER = struct.Struct('<4sHHIId')
+COLUMNS = ('cost_used_purchase', 'cost_new_purchase', 'cost_leasing')
+
+def encode(result: PredictionResult, divisor: int) -> bytes:
+    """Encode a prediction result into a frame.
+
+    @param result: The prediction result.
+    @param divisor: The number of points per year of the time axis the result was computed on.
+        If the year axis of the result does not consist of consecutive multiples of
+        1 / divisor, the year axis is sent as a column.
+    """
+    year = np.asarray(result.year, dtype='<f8')
+    first = int(round(year[0] * divisor)) if year.size else 0
+    flags = 0
+    if not np.array_equal(np.arange(first, first + year.size) / divisor, year):
+        flags |= FLAG_YEAR
+    columns = [year] if flags & FLAG_YEAR else []
+    columns += [np.asarray(getattr(result, name), dtype='<f8') for name in COLUMNS]
+    header = HEADER.pack(MAGIC, VERSION, flags, year.size, first, divisor)
+    return header + b''.join(column.tobytes() for column in columns)
+
+
+def decode(data: bytes) -> PredictionResult:
+    """Decode a frame into a prediction result with numpy arrays, without copying the columns."""
+    magic, version, flags, points, first, divisor = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported frame {magic!r} version {version}")
+    count = len(COLUMNS) + (1 if flags & FLAG_YEAR else 0)
+    columns = list(np.frombuffer(data, dtype='<f8', count=count * points, offset=HEADER.size).reshape(count, points))
+    year = columns.pop(0) if flags & FLAG_YEAR else np.arange(first, first + points) / divisor
+    return PredictionResult(year, year * 12, *columns)
@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+import numpy as np
+import typing as t
+
+from core.prediction import engine
+
+@dataclass
+class Ledger:
+    """The payments of a strategy per month of a time span.
+
+    Payments are booked sparsely, a one-off payment at the month it is due and a recurring
+    payment as a change of the monthly rate at the months it starts and stops, so booking is
+    independent of the length of the time span. The cost over time is the prefix sum of the
+    payments, see cumulative.
+
+        - events: The one-off payments due at the start of each month, of shape (months + 1,).
+        - rate_changes: The changes of the rate paid evenly over each month, of shape (months + 2,).
+    """
+    events: np.ndarray
+    rate_changes: np.ndarray
+
+    @classmethod
+    def create(cls, months: int) -> 'Ledger':
+        return cls(np.zeros(months + 1), np.zeros(months + 2))
+
+    @property
+    def months(self) -> int:
+        return self.events.size - 1
+
+    def book(self, months: np.ndarray, amount: float):
+        """Book a one-off payment at each of the given distinct months within the ledger."""
+        self.events[months] += amount
+
+    def accrue(self, start: np.ndarray, stop: np.ndarray, rate: float):
+        """Book a payment of rate per month over each of the disjoint spans of months [start, stop)."""
+        # spans beyond the ledger collapse onto the last rate change, which is never paid
+        self.rate_changes[np.minimum(start, self.months + 1)] += rate
+        self.rate_changes[np.minimum(stop, self.months + 1)] -= rate
+
+
+def discount_factors(months: int, discount_rate: float) -> np.ndarray:
+    """The present value of a payment at each month, for a yearly discount rate compounded monthly."""
+    return (1 + discount_rate) ** (-np.arange(months + 1) / 12)
+
+
+def cumulative(ledger: Ledger, month: np.ndarray, discount_rate: float = 0.0) -> np.ndarray:
+    """The absolute cost of the payments of a ledger at the given times.
+
+    One prefix sum over the months yields the cost at the start of every month, the rate of
+    the month is interpolated in between. Discounting multiplies the payments of each month
+    with one factor, rates within a month are discounted like the start of the month.
+
+    @param month: The non-negative time in months, within the months of the ledger.
+    @param discount_rate: The yearly rate at which future payments are discounted, 0 for the
+        nominal cost.
+    """
+    rates = np.cumsum(ledger.rate_changes[:-1])
+    payments = ledger.events.copy()
+    if discount_rate != 0:
+        factors = discount_factors(ledger.months, discount_rate)
+        rates *= factors
+        payments *= factors
+    # the cost at the start of each month is the sum of the one-off payments due until then
+    # and of the rates of the months before
+    payments[1:] += rates[:-1]
+    start = np.cumsum(payments)
+    whole = month.astype(np.int64)
+    fraction = month - whole
+    if not fraction.any():
+        return start[whole]
+    return start[whole] + rates[whole] * fraction
+
+
+def book_purchases(ledger: Ledger, price: float, purchase_years: int, initial_years: int):
+    """Book the purchase of a car at the start of every usage period."""
+    period = (purchase_years - initial_years) * 12
+    ledger.book(np.arange(0, ledger.months + 1, period), price)
+
+
+def book_repairs(ledger: Ledger, purchase_years: int, initial_years: int, repair_free_years: int, repair_cost_per_year: float):
+    """Book the repairs of every car from the end of its repair free years until it is replaced."""
+    period = (purchase_years - initial_years) * 12
+    car_repairfree_months = max(0, repair_free_years - initial_years) * 12
+    if repair_cost_per_year == 0 or car_repairfree_months >= period:
+        return
+    purchases = np.arange(0, ledger.months + 1, period)
+    ledger.accrue(purchases + car_repairfree_months, purchases + period, repair_cost_per_year / 12)
+
+
+def used_purchases(ledger: Ledger, params):
+    book_purchases(ledger, params['purchase_used_price'], params['purchase_years'], params['purchase_used_age'])
+
+
+def used_repairs(ledger: Ledger, params):
+    book_repairs(ledger, params['purchase_years'], params['purchase_used_age'], params['repair_free_years'], params['repair_cost_per_year'])
+
+
+def new_purchases(ledger: Ledger, params):
+    book_purchases(ledger, params['purchase_new_price'], params['purchase_years'], 0)
+
+
+def new_repairs(ledger: Ledger, params):
+    book_repairs(ledger, params['purchase_years'], 0, params['repair_free_years'], params['repair_cost_per_year'])
+
+
+def leasing_switches(ledger: Ledger, params):
+    """Book the switch cost at the start of the first month of every lease."""
+    ledger.book(np.arange(1, ledger.months + 1, params['leasing_years'] * 12), params['leasing_switch_cost'])
+
+
+def leasing_rates(ledger: Ledger, params):
+    ledger.accrue(0, ledger.months + 1, params['leasing_cost_per_month'])
+
+
+# the components booking the payments of each cost curve, a new kind of cost, e.g. insurance,
+# is added as a function (ledger, params) to the components of the strategies it applies to
+COMPONENTS: t.Dict[str, t.List[t.Callable[[Ledger, t.Mapping], None]]] = {
+    'cost_used_purchase': [used_purchases, used_repairs],
+    'cost_new_purchase': [new_purchases, new_repairs],
+    'cost_leasing': [leasing_switches, leasing_rates],
+}
+
+def supports(name: str, params) -> bool:
+    """Whether the ledger models a cost curve, which requires the cars to be used for a positive period."""
+    if name == 'cost_used_purchase':
+        return params['purchase_years'] > params['purchase_used_age']
+    return True
+
+
+def predict_curve(name: str, month: np.ndarray, params, discount_rate: float = 0.0) -> np.ndarray:
+    """Compute one cost curve of a single scenario from its ledger, see engine.predict_curve.
+
+    A used car older than its replacement age has no positive usage period, its cost keeps
+    the closed form of the engine, which cannot be discounted.
+
+    @param name: The name of the curve, one of COMPONENTS.
+    @param month: The ascending, non-negative time axis in months.
+    @param params: A mapping of the prediction parameter names to scalars.
+    @param discount_rate: The yearly rate at which future payments are discounted.
+    """
+    if not supports(name, params):
+        assert discount_rate == 0, "Discounting requires purchase_years to be greater than purchase_used_age"
+        return engine.predict_curve(name, month, params)
+    ledger = Ledger.create(int(np.ceil(month[-1])) if len(month) else 0)
+    for component in COMPONENTS[name]:
+        component(ledger, params)
+    return cumulative(ledger, month, discount_rate)
+
+
+def predict(month: np.ndarray, params, discount_rate: float = 0.0) -> tuple:
+    """Compute all cost curves of a single scenario, see engine.predict."""
+    return tuple(predict_curve(name, month, params, discount_rate) for name in COMPONENTS)
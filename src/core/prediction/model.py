@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+import dataclasses
+import math
+import typing as t
+
+# the default time axis consists of the multiples of 1 / POINTS_PER_YEAR within HORIZON_YEARS
+HORIZON_YEARS = 30
+POINTS_PER_YEAR = 2
+MAX_HORIZON_YEARS = 100
+MAX_POINTS_PER_YEAR = 366
+# the highest yearly rate at which future payments may be discounted
+MAX_DISCOUNT_RATE = 1.0
+# the parameters which define the time axis instead of the costs
+AXIS_FIELDS = ('horizon_years', 'points_per_year')
+
+@dataclass
+class PredictionParameters:
+    """Parameters for the prediction of the cost of a car over time.
+
+    @param purchase_years: The number of years the car is used.
+    @param purchase_new_price: The price of a new car.
+    @param purchase_used_price: The price of a used car.
+    @param leasing_cost_per_month: The cost of leasing a car per month.
+    @param leasing_switch_cost: The cost of switching a car.
+    @param leasing_years: The number of years a car is leased.
+    @param repair_cost_per_year: The cost of repairing a car per year.
+    @param repair_free_years: The number of years a car is free of repair.
+    @param purchase_used_age: The age of a used car in years.
+    @param horizon_years: The number of years the time axis spans.
+    @param points_per_year: The number of points per year on the time axis, e.g. 12 for monthly
+        and 365 for daily resolution.
+    """
+    purchase_years: int
+    purchase_new_price: int
+    purchase_used_price: int
+    purchase_used_age: int
+    leasing_cost_per_month: int
+    leasing_switch_cost: int
+    leasing_years: int
+    repair_cost_per_year: int
+    repair_free_years: int
+    horizon_years: int = HORIZON_YEARS
+    points_per_year: int = POINTS_PER_YEAR
+
+    def ensure_valid(self):
+        self.purchase_years = int(self.purchase_years)
+        self.purchase_new_price = int(self.purchase_new_price)
+        self.purchase_used_price = int(self.purchase_used_price)
+        self.purchase_used_age = int(self.purchase_used_age)
+        self.leasing_cost_per_month = int(self.leasing_cost_per_month)
+        self.leasing_switch_cost = int(self.leasing_switch_cost)
+        self.leasing_years = int(self.leasing_years)
+        self.repair_cost_per_year = int(self.repair_cost_per_year)
+        self.repair_free_years = int(self.repair_free_years)
+        self.horizon_years = int(self.horizon_years)
+        self.points_per_year = int(self.points_per_year)
+        assert self.purchase_years > 0, "purchase_years must be greater than 0"
+        assert self.purchase_new_price > 0, "purchase_new_price must be greater than 0"
+        assert self.purchase_used_price > 0, "purchase_used_price must be greater than 0"
+        assert self.purchase_used_age >= 0, "purchase_used_age must be greater than or equal to 0"
+        assert self.leasing_cost_per_month > 0, "leasing_cost_per_month must be greater than 0"
+        assert self.leasing_switch_cost > 0, "leasing_switch_cost must be greater than 0"
+        assert self.leasing_years > 0, "leasing_years must be greater than 0"
+        assert self.repair_cost_per_year >= 0, "repair_cost_per_year must be greater than or equal to 0"
+        assert self.repair_free_years >= 0, "repair_free_years must be greater than or equal to 0"
+        assert 0 < self.horizon_years <= MAX_HORIZON_YEARS, f"horizon_years must be between 1 and {MAX_HORIZON_YEARS}"
+        assert 0 < self.points_per_year <= MAX_POINTS_PER_YEAR, f"points_per_year must be between 1 and {MAX_POINTS_PER_YEAR}"
+        assert self.horizon_years * self.points_per_year > 1, "The time axis must contain at least one point"
+
+    def key(self) -> tuple:
+        """The canonical form of the parameters, equal for parameters with equal values after ensure_valid."""
+        return tuple(getattr(self, field.name) for field in dataclasses.fields(self))
+
+def ensure_valid_years(years) -> float:
+    """Validate a time span in years given apart from the time axis, e.g. the end of a breakeven."""
+    try:
+        years = float(years)
+    except (TypeError, ValueError):
+        raise AssertionError("years must be a number")
+    # raised explicitly, as the time span bounds allocations even if asserts are disabled
+    if not (math.isfinite(years) and 0 < years <= MAX_HORIZON_YEARS):
+        raise AssertionError(f"years must be greater than 0 and at most {MAX_HORIZON_YEARS}")
+    return years
+
+def ensure_valid_discount_rate(discount_rate) -> float:
+    """Validate a yearly rate at which future payments are discounted, 0 for the nominal cost."""
+    try:
+        discount_rate = float(discount_rate)
+    except (TypeError, ValueError):
+        raise AssertionError("discount_rate must be a number")
+    if not (math.isfinite(discount_rate) and 0 <= discount_rate <= MAX_DISCOUNT_RATE):
+        raise AssertionError(f"discount_rate must be between 0 and {MAX_DISCOUNT_RATE}")
+    return discount_rate
+
+def create_range(name: str, bounds) -> range:
+    """Parse the range of a parameter, an object with start, stop and an optional step following
+    the semantics of the builtin range. The values are not allocated, so a range can be counted
+    with range_size before it is materialized.
+    """
+    assert isinstance(bounds, dict), f"The range of {name} must be an object"
+    try:
+        start, stop, step = int(bounds['start']), int(bounds['stop']), int(bounds.get('step', 1))
+    except KeyError as error:
+        raise AssertionError(f"The range of {name} requires {error}")
+    except (TypeError, ValueError, OverflowError):
+        raise AssertionError(f"The range of {name} must consist of integers")
+    assert step != 0, f"The range of {name} must have a step other than 0"
+    assert all(-2**63 <= value < 2**63 for value in (start, stop, step)), f"The range of {name} must consist of 64 bit integers"
+    values = range(start, stop, step)
+    assert range_size(values) > 0, f"The range of {name} must not be empty"
+    return values
+
+
+def range_size(values: range) -> int:
+    """The number of values of a range, unlike len also beyond the size of an index."""
+    return max(0, -((values.start - values.stop) // values.step))
+
+@dataclass
+class PredictionResult:
+    """A data frame with the cost of a car over time, the columns are lists or numpy arrays.
+        - year: The numeric time axis in years.
+        - month: The numeric time axis in months.
+        - cost_used_purchase: The absolute cost of a used car at a given time.
+        - cost_new_purchase: The absolute cost of a new car at a given time.
+        - cost_leasing: The absolute cost of leasing a car at a given time.
+    """
+    year: t.Sequence[float]
+    month: t.Sequence[float]
+    cost_used_purchase: t.Sequence[float]
+    cost_new_purchase: t.Sequence[float]
+    cost_leasing: t.Sequence[float]
+
+
+@dataclass
+class Crossover:
+    """A point in time at which one strategy becomes cheaper than another.
+        - strategies: The names of the two compared cost curves.
+        - cheaper: The name of the cost curve which is cheaper right after the crossover.
+        - year: The time of the crossover in years.
+        - month: The time of the crossover in months.
+        - cost: The absolute cost of the cheaper strategy at the crossover.
+    """
+    strategies: t.List[str]
+    cheaper: str
+    year: float
+    month: float
+    cost: float
@@ -0,0 +1,170 @@
+from dataclasses import dataclass
+import numpy as np
+import typing as t
+
+from core.prediction import engine
+from core.prediction.model import PredictionParameters
+
+# the parameters which may be sampled, the durations stay fixed
+SAMPLED_FIELDS = (
+    'purchase_new_price',
+    'purchase_used_price',
+    'leasing_cost_per_month',
+    'leasing_switch_cost',
+    'repair_cost_per_year',
+)
+DISTRIBUTION_KINDS = ('normal', 'lognormal', 'uniform')
+PERCENTILES = (5, 50, 95)
+# the paths are sampled in chunks with independent seeds, so the samples do not depend on the
+# number of workers or the order in which the chunks are computed
+PATH_CHUNK = 8192
+
+@dataclass
+class Distribution:
+    """The distribution of a sampled parameter around its value.
+
+    @param kind: normal, lognormal or uniform.
+    @param spread: The spread relative to the value of the parameter. The standard deviation
+        of a normal distribution, the sigma of a lognormal distribution with the value as
+        median, or the half width of a uniform distribution.
+    """
+    kind: str
+    spread: float
+
+    def ensure_valid(self):
+        self.kind = str(self.kind)
+        self.spread = float(self.spread)
+        assert self.kind in DISTRIBUTION_KINDS, f"kind must be one of {', '.join(DISTRIBUTION_KINDS)}"
+        assert 0 <= self.spread <= 10, "spread must be between 0 and 10"
+
+
+# the distributions used when a simulation does not specify any
+DEFAULT_DISTRIBUTIONS = {
+    'purchase_new_price': Distribution('normal', 0.05),
+    'purchase_used_price': Distribution('normal', 0.1),
+    'leasing_switch_cost': Distribution('lognormal', 0.3),
+    'repair_cost_per_year': Distribution('lognormal', 0.5),
+}
+
+@dataclass
+class MonteCarloResult:
+    """Percentile bands of the cost of a car over time.
+        - year: The numeric time axis in years.
+        - month: The numeric time axis in months.
+        - percentiles: The percentiles of the bands.
+        - cost_used_purchase: The percentiles of the cost of a used car, of shape (percentiles, time).
+        - cost_new_purchase: The percentiles of the cost of a new car, of shape (percentiles, time).
+        - cost_leasing: The percentiles of the cost of leasing a car, of shape (percentiles, time).
+    """
+    year: np.ndarray
+    month: np.ndarray
+    percentiles: t.List[float]
+    cost_used_purchase: np.ndarray
+    cost_new_purchase: np.ndarray
+    cost_leasing: np.ndarray
+
+
+def sample(params: dict, distributions: t.Dict[str, Distribution], paths: int, seed: int) -> dict:
+    """Sample the parameters of all paths.
+
+    @return: The parameters, where the sampled ones are rows of shape (1, paths).
+    """
+    chunks = -(-paths // PATH_CHUNK)
+    generators = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(chunks)]
+    sampled = dict(params)
+    for name in SAMPLED_FIELDS:
+        distribution = distributions.get(name)
+        if distribution is None:
+            continue
+        values = np.empty(paths)
+        for index, generator in enumerate(generators):
+            chunk = values[index * PATH_CHUNK:(index + 1) * PATH_CHUNK]
+            if distribution.kind == 'normal':
+                chunk[:] = generator.normal(1.0, distribution.spread, chunk.size)
+            elif distribution.kind == 'lognormal':
+                chunk[:] = generator.lognormal(0.0, distribution.spread, chunk.size)
+            else:
+                chunk[:] = generator.uniform(1.0 - distribution.spread, 1.0 + distribution.spread, chunk.size)
+        sampled[name] = np.maximum(0.0, values * params[name]).reshape(1, -1)
+    return sampled
+
+
+def simulate_block(sampled: dict, percentiles: t.List[float], month: np.ndarray) -> tuple:
+    """Compute the percentiles of all paths for a block of the time axis.
+
+    The paths are sampled once per simulation and shared by its blocks, so blocks can be
+    computed by independent workers.
+
+    @param sampled: The parameters of all paths, see sample.
+    @param month: The points of the block in months.
+    @return: A tuple of arrays (cost_used_purchase, cost_new_purchase, cost_leasing), each of
+        shape (percentiles, month.size).
+    """
+    # one row per point, so the percentiles are computed over contiguous memory
+    costs = engine.predict(month.reshape(-1, 1), sampled)
+    return tuple(
+        np.percentile(cost, percentiles, axis=1) if cost.shape[1] > 1
+        # a cost which does not depend on any sampled parameter is the same for all paths
+        else np.repeat(cost.reshape(1, -1), len(percentiles), axis=0)
+        for cost in costs
+    )
+
+
+def count_cells(params: PredictionParameters, paths: int) -> int:
+    """The number of costs of a simulation per strategy, the paths times the points of the time axis."""
+    return paths * max(0, int(params.horizon_years) * int(params.points_per_year) - 1)
+
+
+def split_simulation(params: PredictionParameters, distributions: t.Dict[str, Distribution], paths: int,
+                     seed: int = 0, percentiles: t.Sequence[float] = PERCENTILES, block_cells: int = 2000000) -> tuple:
+    """Validate a simulation, sample its paths and split its time axis into blocks of at most
+    block_cells paths times points, or a single point if the paths exceed block_cells.
+
+    @return: A tuple (year, month, percentiles, blocks), where each block is a tuple of the
+        arguments of simulate_block. The results of the blocks are joined with join_simulation.
+    """
+    params.ensure_valid()
+    assert params.purchase_used_age != params.purchase_years, "purchase_used_age must differ from purchase_years"
+    assert paths > 0, "paths must be greater than 0"
+    percentiles = [float(percentile) for percentile in percentiles]
+    assert percentiles and all(0 <= percentile <= 100 for percentile in percentiles), "percentiles must be between 0 and 100"
+    unknown = set(distributions).difference(SAMPLED_FIELDS)
+    assert not unknown, f"Cannot sample: {', '.join(sorted(unknown))}"
+    for distribution in distributions.values():
+        distribution.ensure_valid()
+
+    year, month = engine.time_axis(params.horizon_years, params.points_per_year)
+    sampled = sample(params.__dict__, distributions, paths, seed)
+    block = max(1, block_cells // paths)
+    blocks = [(sampled, percentiles, month[start:start + block]) for start in range(0, month.size, block)]
+    return year, month, percentiles, blocks
+
+
+def join_simulation(year: np.ndarray, month: np.ndarray, percentiles: t.List[float], results: t.List[tuple]) -> MonteCarloResult:
+    """Join the results of the blocks of a simulation, in the order of the blocks."""
+    return MonteCarloResult(
+        year,
+        month,
+        percentiles,
+        *(np.concatenate([result[index] for result in results], axis=1) for index in range(3))
+    )
+
+
+def simulate(params: PredictionParameters, distributions: t.Dict[str, Distribution], paths: int,
+             seed: int = 0, percentiles: t.Sequence[float] = PERCENTILES, block_cells: int = 2000000,
+             map: t.Callable = map) -> MonteCarloResult:
+    """Simulate the cost of a car over time with sampled parameters.
+
+    The paths are sampled once, then the time axis is split into blocks of at most block_cells
+    paths times points, which are computed independently and may be distributed over workers, e.g. with the map of a
+    process pool. The result only depends on the seed, not on the blocks or workers.
+
+        @param distributions: The sampled parameters mapped to their distributions.
+        @param paths: The number of sampled paths.
+        @param seed: The seed of the random number generator.
+        @param percentiles: The percentiles of the bands, between 0 and 100.
+        @param block_cells: The maximum number of paths times points computed at once.
+        @param map: The function used to map the blocks to their results.
+    """
+    year, month, percentiles, blocks = split_simulation(params, distributions, paths, seed, percentiles, block_cells)
+    return join_simulation(year, month, percentiles, list(map(simulate_block, *zip(*blocks))))
@@ -0,0 +1,221 @@
+from dataclasses import dataclass
+import dataclasses
+import heapq
+import math
+import numpy as np
+import typing as t
+
+from core.prediction import engine
+from core.prediction.model import PredictionParameters, AXIS_FIELDS, ensure_valid_years, create_range, range_size
+
+# the searched parameters each cost curve depends on
+SEARCH_FIELDS = {
+    'cost_used_purchase': ('purchase_years', 'purchase_used_age'),
+    'cost_new_purchase': ('purchase_years',),
+    'cost_leasing': ('leasing_years',),
+}
+# the search space if a request does not restrict it, the ranges offered by the app
+DEFAULT_RANGES = {
+    'purchase_years': {'start': 5, 'stop': 21},
+    'purchase_used_age': {'start': 0, 'stop': 11},
+    'leasing_years': {'start': 1, 'stop': 7},
+}
+MAX_TOP = 100
+# the parameters which stay fixed during the search
+FIXED_FIELDS = tuple(
+    field.name for field in dataclasses.fields(PredictionParameters)
+    if field.name not in DEFAULT_RANGES and field.name not in AXIS_FIELDS
+)
+
+@dataclass
+class Candidate:
+    """A configuration of a strategy.
+        - strategy: The name of the cost curve.
+        - purchase_years: The number of years a car is used, None for leasing.
+        - purchase_used_age: The age of a used car in years, None unless the strategy is a used purchase.
+        - leasing_years: The number of years a car is leased, None unless the strategy is leasing.
+        - cost: The absolute cost at the end of the horizon.
+        - cost_per_month: The average cost per month over the horizon.
+    """
+    strategy: str
+    purchase_years: t.Optional[int]
+    purchase_used_age: t.Optional[int]
+    leasing_years: t.Optional[int]
+    cost: float
+    cost_per_month: float
+
+
+@dataclass
+class OptimizationResult:
+    """The cheapest configurations over a horizon.
+        - years: The horizon in years.
+        - best: The names of the cost curves mapped to their cheapest configuration, a strategy
+          without any valid configuration is omitted.
+        - top: The cheapest configurations of all strategies, ascending by cost.
+        - evaluated: The number of configurations whose cost was computed.
+        - pruned: The number of configurations skipped, as they could not be among the results.
+    """
+    years: float
+    best: t.Dict[str, Candidate]
+    top: t.List[Candidate]
+    evaluated: int
+    pruned: int
+
+
+def ensure_valid_fixed(fixed: dict) -> t.Dict[str, int]:
+    """Validate the fixed parameters of a search, the searched and time axis fields are ignored."""
+    assert isinstance(fixed, dict), "The parameters must be an object"
+    values = {}
+    for name in FIXED_FIELDS:
+        assert name in fixed, f"{name} is required"
+        try:
+            values[name] = int(fixed[name])
+        except (TypeError, ValueError, OverflowError):
+            raise AssertionError(f"{name} must be an integer")
+    # the searched fields are placeholders, so only the rules of the fixed fields can fail
+    PredictionParameters(**values, purchase_years=1, purchase_used_age=0, leasing_years=1).ensure_valid()
+    return values
+
+
+def create_search_ranges(ranges: t.Optional[t.Dict[str, dict]]) -> t.Dict[str, range]:
+    """Validate the ranges of the searched parameters without allocating their values.
+
+        @param ranges: The searched parameters mapped to a range with start, stop and step,
+            following the semantics of the builtin range. Omitted parameters use DEFAULT_RANGES.
+        @return: The searched parameters mapped to their values as builtin ranges.
+    """
+    ranges = ranges or {}
+    assert isinstance(ranges, dict), "The ranges must be an object"
+    unknown = set(ranges).difference(DEFAULT_RANGES)
+    assert not unknown, f"Cannot search: {', '.join(sorted(unknown))}"
+    values = {}
+    for name, default in DEFAULT_RANGES.items():
+        column = create_range(name, ranges.get(name, default))
+        minimum = 0 if name == 'purchase_used_age' else 1
+        assert min(column[0], column[-1]) >= minimum, f"The range of {name} must not contain values less than {minimum}"
+        values[name] = column
+    return values
+
+
+def count_candidates(ranges: t.Dict[str, range]) -> int:
+    """The number of configurations of all strategies, before excluding invalid ones."""
+    return sum(math.prod(range_size(ranges[name]) for name in fields) for fields in SEARCH_FIELDS.values())
+
+
+def create_search_values(ranges: t.Dict[str, range]) -> t.Dict[str, np.ndarray]:
+    """The ascending values of the searched parameters, see create_search_ranges."""
+    return {name: np.sort(np.arange(column.start, column.stop, column.step, dtype=np.int64)) for name, column in ranges.items()}
+
+
+def search_grid(strategy: str, values: t.Dict[str, np.ndarray]) -> t.Dict[str, np.ndarray]:
+    """The valid configurations of a strategy, as flat columns of the searched parameters."""
+    fields = SEARCH_FIELDS[strategy]
+    grid = np.meshgrid(*(values[name] for name in fields), indexing='ij')
+    columns = {name: column.ravel() for name, column in zip(fields, grid)}
+    if 'purchase_used_age' in columns:
+        # a used car must be younger than the age at which it is replaced
+        valid = columns['purchase_used_age'] < columns['purchase_years']
+        columns = {name: column[valid] for name, column in columns.items()}
+    return columns
+
+
+def lower_bound(strategy: str, fixed: t.Dict[str, int], columns: t.Dict[str, np.ndarray], month: float) -> np.ndarray:
+    """A lower bound of the average cost per month of configurations, cheaper than computing it.
+
+    The bound is the cost of the engine without repairs, which are not negative, so it never
+    exceeds the cost of a configuration at any month of the horizon. The cost of leasing has
+    no repairs, so its bound is exact.
+    """
+    if strategy == 'cost_leasing':
+        return engine.cost_leasing(month, columns['leasing_years'], fixed['leasing_switch_cost'], fixed['leasing_cost_per_month']) / month
+    age = columns.get('purchase_used_age', 0)
+    price = fixed['purchase_used_price' if strategy == 'cost_used_purchase' else 'purchase_new_price']
+    return engine.cost_purchase(month, price, columns['purchase_years'], age, fixed['repair_free_years'], 0) / month
+
+
+def optimize(fixed: dict, ranges: t.Optional[t.Dict[str, dict]], years: float, top: int = 5, block_size: int = 4096) -> OptimizationResult:
+    """Find the configurations with the lowest average cost per month over a horizon.
+
+    The price parameters stay fixed, while purchase_years, purchase_used_age and leasing_years
+    are searched. The configurations of each strategy are ordered by a lower bound of their
+    cost and computed in vectorized blocks. A block is skipped once its lowest bound cannot
+    beat the cheapest configuration of the strategy nor the top configurations found so far,
+    and configurations within a block are skipped by the same rule.
+
+        @param fixed: The values of the fixed parameters, see FIXED_FIELDS.
+        @param ranges: The ranges of the searched parameters, see create_search_ranges. The
+            number of configurations should be checked with count_candidates first, as every
+            one of them is allocated.
+        @param years: The horizon in years, at most MAX_HORIZON_YEARS.
+        @param top: The number of cheapest configurations of all strategies to return.
+        @param block_size: The number of configurations computed at once.
+    """
+    fixed = ensure_valid_fixed(fixed)
+    values = create_search_values(create_search_ranges(ranges))
+    years = ensure_valid_years(years)
+    top = int(top)
+    assert 0 <= top <= MAX_TOP, f"top must be between 0 and {MAX_TOP}"
+    month = years * 12
+
+    best = {}
+    # a max heap of the cheapest configurations as (-cost per month, order, candidate)
+    heap = []
+    order = 0
+    evaluated = 0
+    pruned = 0
+
+    def threshold(strategy: str) -> float:
+        """The cost per month a configuration must be below to be among the results."""
+        cheapest = best[strategy].cost_per_month if strategy in best else np.inf
+        if top == 0:
+            return cheapest
+        return max(cheapest, -heap[0][0] if len(heap) == top else np.inf)
+
+    for strategy, fields in SEARCH_FIELDS.items():
+        columns = search_grid(strategy, values)
+        bound = lower_bound(strategy, fixed, columns, month)
+        ascending = np.argsort(bound, kind='stable')
+        columns = {name: column[ascending] for name, column in columns.items()}
+        bound = bound[ascending]
+
+        # the blocks grow from a small first block, so the bounds can prune early in small searches
+        start, size = 0, min(block_size, 2 * max(top, 1))
+        while start < bound.size:
+            limit = threshold(strategy)
+            if bound[start] >= limit:
+                pruned += bound.size - start
+                break
+            block = slice(start, min(start + size, bound.size))
+            start, size = block.stop, min(block_size, 2 * size)
+            keep = np.flatnonzero(bound[block] < limit) + block.start
+            pruned += block.stop - block.start - keep.size
+            block_columns = {name: column[keep] for name, column in columns.items()}
+            cost = engine.predict_curve(strategy, np.float64(month), {**fixed, **block_columns})
+            per_month = cost / month
+            evaluated += keep.size
+
+            # only the cheapest of a block may enter the results
+            count = min(keep.size, max(top, 1))
+            cheapest = np.argpartition(per_month, count - 1)[:count] if count < keep.size else np.arange(keep.size)
+            for index in cheapest[np.argsort(per_month[cheapest], kind='stable')].tolist():
+                candidate = Candidate(
+                    strategy,
+                    int(block_columns['purchase_years'][index]) if 'purchase_years' in block_columns else None,
+                    int(block_columns['purchase_used_age'][index]) if 'purchase_used_age' in block_columns else None,
+                    int(block_columns['leasing_years'][index]) if 'leasing_years' in block_columns else None,
+                    float(cost[index]),
+                    float(per_month[index]),
+                )
+                if strategy not in best or candidate.cost_per_month < best[strategy].cost_per_month:
+                    best[strategy] = candidate
+                if top:
+                    # equal costs keep the configuration found first
+                    entry = (-candidate.cost_per_month, -order, candidate)
+                    order += 1
+                    if len(heap) < top:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+
+    ranked = [candidate for _, _, candidate in sorted(heap, key=lambda entry: (-entry[0], -entry[1]))]
+    return OptimizationResult(years, best, ranked, evaluated, pruned)
@@ -0,0 +1,446 @@
+from dataclasses import dataclass
+import dataclasses
+import math
+import numpy as np
+import typing as t
+
+from core.prediction import engine, ledger
+from core.prediction.model import (
+    PredictionParameters, PredictionResult, Crossover,
+    AXIS_FIELDS, MAX_HORIZON_YEARS, MAX_POINTS_PER_YEAR, ensure_valid_years,
+    create_range, range_size
+)
+
+def create_prediction_data_frame(params: PredictionParameters) -> PredictionResult:
+    """Create a data frame with the cost of a car over time.
+
+        @return: A data frame with the cost of a car over time.
+            - year: The numeric time axis in years.
+            - month: The numeric time axis in months.
+            - cost_used_purchase: The absolute cost of a used car at a given time.
+            - cost_new_purchase: The absolute cost of a new car at a given time.
+            - cost_leasing: The absolute cost of leasing a car at a given time.
+    """
+    result = create_prediction_arrays(params)
+    return PredictionResult(*(column.tolist() for column in result.__dict__.values()))
+
+
+def predict_curve(name: str, month: np.ndarray, params: PredictionParameters, discount_rate: float = 0.0) -> np.ndarray:
+    """Compute one cost curve of a single scenario.
+
+    The nominal cost is computed by the closed forms of the engine, like the batches, sweeps
+    and every other prediction, so all of them agree exactly. Only discounted costs are
+    computed from the ledger, see ledger.cumulative.
+
+        @param discount_rate: The yearly rate at which future payments are discounted, 0 for
+            the nominal cost. Discounting requires purchase_years to be greater than
+            purchase_used_age.
+    """
+    if discount_rate:
+        return ledger.predict_curve(name, month, params.__dict__, discount_rate)
+    return engine.predict_curve(name, month, params.__dict__)
+
+
+def create_prediction_arrays(params: PredictionParameters, discount_rate: float = 0.0) -> PredictionResult:
+    """Like create_prediction_data_frame, but the columns are numpy arrays instead of lists.
+
+        @param discount_rate: The yearly rate at which future payments are discounted, see predict_curve.
+    """
+    params.ensure_valid()
+
+    year, month = engine.time_axis(params.horizon_years, params.points_per_year)
+    return PredictionResult(year, month, *(predict_curve(name, month, params, discount_rate) for name in engine.CURVE_FIELDS))
+
+
+def create_prediction_curves(params: PredictionParameters, curve_cache, discount_rate: float = 0.0) -> t.Tuple[PredictionResult, t.List[str]]:
+    """Like create_prediction_arrays, but each cost curve is taken from a cache if possible.
+
+    Each curve is keyed on the time axis and only the parameters it depends on, see
+    engine.CURVE_FIELDS, so changing the leasing parameters reuses the purchase curves and
+    vice versa. The cached arrays are shared and therefore read-only.
+
+        @param curve_cache: The cache of the curves, with get(key) and put(key, value) like
+            cache.LruCache of the api.
+        @param discount_rate: The yearly rate at which future payments are discounted, see predict_curve.
+        @return: A tuple (result, cached) with the names of the curves taken from the cache.
+    """
+    params.ensure_valid()
+
+    year, month = engine.time_axis(params.horizon_years, params.points_per_year)
+    curves = []
+    cached = []
+    for name, fields in engine.CURVE_FIELDS.items():
+        key = (engine.ENGINE_VERSION, name, params.horizon_years, params.points_per_year, discount_rate) + tuple(getattr(params, field) for field in fields)
+        curve = curve_cache.get(key)
+        if curve is None:
+            curve = predict_curve(name, month, params, discount_rate)
+            curve.flags.writeable = False
+            curve_cache.put(key, curve)
+        else:
+            cached.append(name)
+        curves.append(curve)
+    return PredictionResult(year, month, *curves), cached
+
+
+def downsample_prediction(result: PredictionResult, max_points: int) -> PredictionResult:
+    """Reduce a prediction to at most max_points points, preserving the shape of the cost curves.
+
+        @param result: The prediction with numpy arrays, as created by create_prediction_arrays.
+        @param max_points: The maximum number of points, at least 8.
+    """
+    assert max_points >= 8, "max_points must be greater than or equal to 8"
+    indices = engine.downsample(
+        (result.cost_used_purchase, result.cost_new_purchase, result.cost_leasing),
+        max_points
+    )
+    if indices.size == len(result.year):
+        return result
+    return PredictionResult(*(column[indices] for column in result.__dict__.values()))
+
+
+def create_parameter_columns(rows: t.List[dict]) -> t.Dict[str, np.ndarray]:
+    """Transpose many parameter sets into one column per parameter.
+
+        @param rows: The parameter sets, each a mapping of all PredictionParameters fields.
+            The fields of the time axis may be omitted, but must be equal for all sets.
+        @return: A mapping of the parameter names to integer columns of shape (n, 1), and
+            of the fields of the time axis to integers.
+    """
+    assert isinstance(rows, list), "The parameter sets must be a list"
+    assert all(isinstance(row, dict) for row in rows), "Each parameter set must be an object"
+    names = [field.name for field in dataclasses.fields(PredictionParameters)]
+    unknown = set().union(*rows).difference(names)
+    assert not unknown, f"Unknown parameters: {', '.join(sorted(unknown))}"
+    columns = {}
+    for name in AXIS_FIELDS:
+        default = getattr(PredictionParameters, name)
+        try:
+            values = set(int(row.get(name, default)) for row in rows) or {default}
+        except (TypeError, ValueError):
+            raise AssertionError(f"{name} must be an integer")
+        assert len(values) == 1, f"{name} must be equal for all parameter sets"
+        columns[name] = values.pop()
+    for name in names:
+        if name in AXIS_FIELDS:
+            continue
+        try:
+            column = np.array([row[name] for row in rows], dtype=np.int64)
+        except KeyError:
+            raise AssertionError(f"{name} is required")
+        except (TypeError, ValueError, OverflowError):
+            raise AssertionError(f"{name} must be an integer")
+        columns[name] = column.reshape(-1, 1)
+    return columns
+
+
+def invalid_parameter_sets(columns: t.Dict[str, np.ndarray]) -> t.Dict[str, np.ndarray]:
+    """Find the parameter sets which violate the rules of PredictionParameters.ensure_valid.
+
+        @param columns: The parameter columns as created by create_parameter_columns.
+        @return: The violated rules mapped to the ascending indices of the violating sets.
+    """
+    rules = {
+        "purchase_years must be greater than 0": columns['purchase_years'] > 0,
+        "purchase_new_price must be greater than 0": columns['purchase_new_price'] > 0,
+        "purchase_used_price must be greater than 0": columns['purchase_used_price'] > 0,
+        "purchase_used_age must be greater than or equal to 0": columns['purchase_used_age'] >= 0,
+        "purchase_used_age must differ from purchase_years": columns['purchase_used_age'] != columns['purchase_years'],
+        "leasing_cost_per_month must be greater than 0": columns['leasing_cost_per_month'] > 0,
+        "leasing_switch_cost must be greater than 0": columns['leasing_switch_cost'] > 0,
+        "leasing_years must be greater than 0": columns['leasing_years'] > 0,
+        "repair_cost_per_year must be greater than or equal to 0": columns['repair_cost_per_year'] >= 0,
+        "repair_free_years must be greater than or equal to 0": columns['repair_free_years'] >= 0,
+    }
+    invalid = {}
+    for message, valid in rules.items():
+        indices = np.flatnonzero(~valid)
+        if indices.size:
+            invalid[message] = indices
+    return invalid
+
+
+def ensure_valid_columns(columns: t.Dict[str, np.ndarray]):
+    """Validate many parameter sets at once, see PredictionParameters.ensure_valid."""
+    for message, invalid in invalid_parameter_sets(columns).items():
+        raise AssertionError(f"{message} (parameter sets {invalid[:10].tolist()})")
+    assert 0 < columns['horizon_years'] <= MAX_HORIZON_YEARS, f"horizon_years must be between 1 and {MAX_HORIZON_YEARS}"
+    assert 0 < columns['points_per_year'] <= MAX_POINTS_PER_YEAR, f"points_per_year must be between 1 and {MAX_POINTS_PER_YEAR}"
+    assert columns['horizon_years'] * columns['points_per_year'] > 1, "The time axis must contain at least one point"
+
+
+@dataclass
+class PredictionBatchResult:
+    """The cost of many cars over time, with one row per parameter set.
+        - year: The numeric time axis in years.
+        - month: The numeric time axis in months.
+        - cost_used_purchase: The absolute cost of a used car, of shape (parameter sets, time).
+        - cost_new_purchase: The absolute cost of a new car, of shape (parameter sets, time).
+        - cost_leasing: The absolute cost of leasing a car, of shape (parameter sets, time).
+    """
+    year: np.ndarray
+    month: np.ndarray
+    cost_used_purchase: np.ndarray
+    cost_new_purchase: np.ndarray
+    cost_leasing: np.ndarray
+
+
+def create_prediction_batch(columns: t.Dict[str, np.ndarray]) -> PredictionBatchResult:
+    """Compute the cost of many cars over time in one pass.
+
+        @param columns: The parameter sets as created by create_parameter_columns.
+        @return: The costs of all parameter sets at all times.
+    """
+    ensure_valid_columns(columns)
+
+    year, month = engine.time_axis(columns['horizon_years'], columns['points_per_year'])
+    cost_used_purchase, cost_new_purchase, cost_leasing = engine.predict(month, columns)
+    return PredictionBatchResult(year, month, cost_used_purchase, cost_new_purchase, cost_leasing)
+
+
+def split_parameter_columns(columns: t.Dict[str, np.ndarray], parts: int) -> t.List[t.Dict[str, np.ndarray]]:
+    """Split parameter sets into at most parts chunks of consecutive sets, e.g. to compute them in parallel.
+
+        @param columns: The parameter sets as created by create_parameter_columns.
+        @return: The chunks, each like the columns. The columns are views, not copies.
+    """
+    size = next(column.shape[0] for name, column in columns.items() if name not in AXIS_FIELDS)
+    bounds = np.linspace(0, size, min(max(1, parts), max(1, size)) + 1).astype(int)
+    return [
+        {name: column if name in AXIS_FIELDS else column[start:stop] for name, column in columns.items()}
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def concatenate_batches(results: t.List[PredictionBatchResult]) -> PredictionBatchResult:
+    """Join the results of the chunks created by split_parameter_columns, in order."""
+    if len(results) == 1:
+        return results[0]
+    return PredictionBatchResult(
+        results[0].year,
+        results[0].month,
+        *(np.concatenate([getattr(result, name) for result in results]) for name in ('cost_used_purchase', 'cost_new_purchase', 'cost_leasing'))
+    )
+
+
+@dataclass
+class PredictionSweepResult:
+    """The cost of a car over a grid of parameter values.
+        - axes: The swept parameter names mapped to their values, in grid axis order.
+        - year: The numeric time axis in years, or the single year the grid is reduced to.
+        - cost_used_purchase: The absolute cost of a used car, of shape (*axes, time).
+        - cost_new_purchase: The absolute cost of a new car, of shape (*axes, time).
+        - cost_leasing: The absolute cost of leasing a car, of shape (*axes, time).
+        If the grid is reduced to a single year the time dimension is omitted.
+    """
+    axes: t.Dict[str, np.ndarray]
+    year: t.Union[np.ndarray, float]
+    cost_used_purchase: np.ndarray
+    cost_new_purchase: np.ndarray
+    cost_leasing: np.ndarray
+
+
+def create_parameter_ranges(ranges: t.Dict[str, dict]) -> t.Dict[str, range]:
+    """Validate the swept parameters of a grid without allocating their values.
+
+        @param ranges: The swept parameters mapped to a range, see create_parameter_grid.
+        @return: The swept parameters mapped to their values as builtin ranges.
+    """
+    assert isinstance(ranges, dict) and ranges, "At least one parameter range is required"
+    names = [field.name for field in dataclasses.fields(PredictionParameters)]
+    unknown = set(ranges).difference(names)
+    assert not unknown, f"Unknown parameters: {', '.join(sorted(unknown))}"
+    swept_axis = set(ranges).intersection(AXIS_FIELDS)
+    assert not swept_axis, f"Cannot sweep the time axis: {', '.join(sorted(swept_axis))}"
+    return {name: create_range(name, bounds) for name, bounds in ranges.items()}
+
+
+def parameter_time_axis(fixed: dict) -> t.Dict[str, int]:
+    """The fields of the time axis of a grid, the defaults of PredictionParameters unless fixed."""
+    assert isinstance(fixed, dict), "The fixed parameters must be an object"
+    axis = {}
+    for name in AXIS_FIELDS:
+        try:
+            axis[name] = int(fixed.get(name, getattr(PredictionParameters, name)))
+        except (TypeError, ValueError, OverflowError):
+            raise AssertionError(f"{name} must be an integer")
+    return axis
+
+
+def count_sweep_cells(fixed: dict, ranges: t.Dict[str, range], year: t.Optional[float] = None) -> int:
+    """The number of costs a sweep computes per strategy, before any of its arrays is allocated.
+
+        @param ranges: The swept parameters as created by create_parameter_ranges.
+        @param year: The single year the grid is reduced to, None for the whole time axis.
+    """
+    cells = math.prod(range_size(values) for values in ranges.values())
+    if year is None:
+        axis = parameter_time_axis(fixed)
+        cells *= max(0, axis['horizon_years'] * axis['points_per_year'] - 1)
+    return cells
+
+
+def create_parameter_grid(fixed: dict, ranges: t.Dict[str, dict]) -> t.Tuple[t.Dict[str, np.ndarray], t.Dict[str, np.ndarray]]:
+    """Create broadcastable parameter columns spanning a grid over the swept parameters.
+
+        @param fixed: The values of the parameters which are not swept. The fields of the
+            time axis may be omitted.
+        @param ranges: The swept parameters mapped to a range with start, stop and step,
+            following the semantics of the builtin range. The fields of the time axis
+            cannot be swept.
+        @return: A tuple (axes, columns). The axes map the swept parameters to their values,
+            the columns map every parameter to an array with one dimension per swept
+            parameter, where only the dimension of the parameter itself is not 1, and the
+            fields of the time axis to integers. The size of the grid should be checked with
+            count_sweep_cells first, as every swept value is allocated.
+    """
+    ranges = create_parameter_ranges(ranges)
+    columns = parameter_time_axis(fixed)
+    names = [field.name for field in dataclasses.fields(PredictionParameters)]
+    unknown = set(fixed).difference(names)
+    assert not unknown, f"Unknown parameters: {', '.join(sorted(unknown))}"
+
+    axes = {}
+    for index, (name, bounds) in enumerate(ranges.items()):
+        values = np.arange(bounds.start, bounds.stop, bounds.step, dtype=np.int64)
+        shape = [1] * len(ranges)
+        shape[index] = values.size
+        axes[name] = values
+        columns[name] = values.reshape(shape)
+
+    for name in names:
+        if name in columns:
+            continue
+        assert name in fixed, f"{name} is required"
+        try:
+            columns[name] = np.array(int(fixed[name]), dtype=np.int64).reshape([1] * len(ranges))
+        except (TypeError, ValueError, OverflowError):
+            raise AssertionError(f"{name} must be an integer")
+    return axes, columns
+
+
+def create_prediction_sweep(axes: t.Dict[str, np.ndarray], columns: t.Dict[str, np.ndarray], year: t.Optional[float] = None) -> PredictionSweepResult:
+    """Compute the cost of a car for every cell of a parameter grid.
+
+        @param axes: The swept parameters as created by create_parameter_grid.
+        @param columns: The parameter columns as created by create_parameter_grid.
+        @param year: If given, the grid is only evaluated at this year instead of the time axis.
+        @return: The costs of all grid cells.
+    """
+    ensure_valid_columns(columns)
+
+    shape = tuple(values.size for values in axes.values())
+    if year is None:
+        year, month = engine.time_axis(columns['horizon_years'], columns['points_per_year'])
+        columns = {name: column[..., np.newaxis] for name, column in columns.items() if name not in AXIS_FIELDS}
+        shape += (month.size,)
+    else:
+        year = float(year)
+        assert year > 0, "year must be greater than 0"
+        month = np.float64(year * 12)
+
+    costs = engine.predict(month, columns)
+    return PredictionSweepResult(axes, year, *(np.broadcast_to(cost, shape) for cost in costs))
+
+
+def split_parameter_grid(axes: t.Dict[str, np.ndarray], columns: t.Dict[str, np.ndarray], parts: int) -> t.List[tuple]:
+    """Split a parameter grid along its first axis into at most parts chunks, e.g. to compute them in parallel.
+
+        @param axes: The swept parameters as created by create_parameter_grid.
+        @param columns: The parameter columns as created by create_parameter_grid.
+        @return: The chunks as tuples (axes, columns), each like the grid. The columns are views, not copies.
+    """
+    first = next(iter(axes))
+    size = axes[first].size
+    bounds = np.linspace(0, size, min(max(1, parts), size) + 1).astype(int)
+    chunks = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        chunk_axes = dict(axes)
+        chunk_axes[first] = axes[first][start:stop]
+        chunk_columns = dict(columns)
+        chunk_columns[first] = columns[first][start:stop]
+        chunks.append((chunk_axes, chunk_columns))
+    return chunks
+
+
+def concatenate_sweeps(results: t.List[PredictionSweepResult]) -> PredictionSweepResult:
+    """Join the results of the chunks created by split_parameter_grid, in order."""
+    if len(results) == 1:
+        return results[0]
+    axes = dict(results[0].axes)
+    first = next(iter(axes))
+    axes[first] = np.concatenate([result.axes[first] for result in results])
+    return PredictionSweepResult(
+        axes,
+        results[0].year,
+        *(np.concatenate([getattr(result, name) for result in results]) for name in ('cost_used_purchase', 'cost_new_purchase', 'cost_leasing'))
+    )
+
+
+def create_breakeven(params: PredictionParameters, years: t.Optional[float] = None) -> t.List[Crossover]:
+    """Compute the exact crossovers between each pair of strategies.
+
+    The cost curves are piecewise linear, so the crossovers are solved analytically on
+    each segment between the jumps and bends of the two curves instead of sampling.
+
+        @param years: The end of the time span in years, at most MAX_HORIZON_YEARS, defaults to
+            the end of the time axis.
+        @return: The crossovers of all pairs of strategies in chronological order.
+    """
+    params.ensure_valid()
+    if years is None:
+        horizon = engine.time_axis(params.horizon_years, params.points_per_year)[1][-1]
+    else:
+        # the breakpoints are allocated per usage period, so the time span must be bounded
+        horizon = ensure_valid_years(years) * 12
+
+    def used_purchase():
+        args = (params.purchase_years, params.purchase_used_age, params.repair_free_years)
+        cost = lambda month: engine.cost_purchase(month, params.purchase_used_price, *args, params.repair_cost_per_year)
+        slope = lambda month: engine.purchase_slope(month, *args, params.repair_cost_per_year)
+        return engine.purchase_breakpoints(horizon, *args), cost, slope
+
+    def new_purchase():
+        args = (params.purchase_years, 0, params.repair_free_years)
+        cost = lambda month: engine.cost_purchase(month, params.purchase_new_price, *args, params.repair_cost_per_year)
+        slope = lambda month: engine.purchase_slope(month, *args, params.repair_cost_per_year)
+        return engine.purchase_breakpoints(horizon, *args), cost, slope
+
+    def leasing():
+        args = (params.leasing_years, params.leasing_switch_cost, params.leasing_cost_per_month)
+        cost = lambda month: engine.cost_leasing(month, *args)
+        slope = lambda month: engine.leasing_slope(month, params.leasing_cost_per_month)
+        return engine.leasing_breakpoints(horizon, params.leasing_years), cost, slope
+
+    curves = {
+        'cost_used_purchase': used_purchase(),
+        'cost_new_purchase': new_purchase(),
+        'cost_leasing': leasing(),
+    }
+
+    crossovers = []
+    for first, second in [
+        ('cost_used_purchase', 'cost_new_purchase'),
+        ('cost_used_purchase', 'cost_leasing'),
+        ('cost_new_purchase', 'cost_leasing'),
+    ]:
+        breakpoints_first, cost_first, slope_first = curves[first]
+        breakpoints_second, cost_second, slope_second = curves[second]
+        start = np.union1d(np.union1d(breakpoints_first, breakpoints_second), [0.0])
+        end = np.append(start[1:], horizon)
+        months, signs = engine.find_crossovers(
+            start,
+            end,
+            cost_first(start) - cost_second(start),
+            slope_first(start) - slope_second(start)
+        )
+        for month, sign in zip(months.tolist(), signs.tolist()):
+            cheaper = second if sign > 0 else first
+            crossovers.append(Crossover(
+                [first, second],
+                cheaper,
+                month / 12,
+                month,
+                float(curves[cheaper][1](np.float64(month)))
+            ))
+    crossovers.sort(key=lambda crossover: crossover.month)
+    return crossovers
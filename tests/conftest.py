@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the core package is shared between the api and the app, like their entry points do
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
@@ -0,0 +1,107 @@
+import asyncio
+import base64
+import os
+import sys
+
+import httpx
+import pytest
+
+os.environ.setdefault('CAR_CLIENT_ID', 'test-client')
+os.environ['DEBUG'] = ''
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'api'))
+
+import server  # noqa: E402
+
+PARAMETERS = {
+    "purchase_years": 10, "purchase_new_price": 40000, "purchase_used_price": 20000, "purchase_used_age": 3,
+    "leasing_cost_per_month": 400, "leasing_switch_cost": 1000, "leasing_years": 3,
+    "repair_cost_per_year": 1000, "repair_free_years": 5, "horizon_years": 10, "points_per_year": 12,
+}
+
+HEADERS = {"Authorization": f"Bearer {base64.b64encode(os.environ['CAR_CLIENT_ID'].encode()).decode()}"}
+
+def post(path: str, body: dict) -> httpx.Response:
+    async def send():
+        async with httpx.AsyncClient(app=server.app, base_url="http://test") as client:
+            return await client.post(path, json=body, headers=HEADERS)
+    return asyncio.run(send())
+
+
+@pytest.mark.parametrize("stop", [10**8, 10**12, 10**30])
+def test_sweep_rejects_oversized_range_before_allocating(stop):
+    response = post("/prediction/sweep", {
+        "parameters": {"horizon_years": 10, "points_per_year": 12},
+        "ranges": {"purchase_new_price": {"start": 1, "stop": stop}},
+        "year": 5,
+    })
+    assert response.status_code == (413 if stop < 2**63 else 400)
+
+
+def test_sweep_rejects_oversized_product_of_ranges():
+    response = post("/prediction/sweep", {
+        "ranges": {
+            "purchase_new_price": {"start": 1, "stop": 100001},
+            "purchase_used_price": {"start": 1, "stop": 100001},
+        },
+        "year": 5,
+    })
+    assert response.status_code == 413
+
+
+def test_sweep_within_limit():
+    response = post("/prediction/sweep", {
+        "parameters": {name: value for name, value in PARAMETERS.items() if name != "purchase_new_price"},
+        "ranges": {"purchase_new_price": {"start": 10000, "stop": 50000, "step": 10000}},
+        "year": 5,
+    })
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("stop", [10**8, 10**12])
+def test_optimize_rejects_oversized_range_before_allocating(stop):
+    response = post("/prediction/optimize", {
+        "parameters": PARAMETERS,
+        "ranges": {"purchase_years": {"start": 1, "stop": stop}},
+        "years": 10,
+    })
+    assert response.status_code == 413
+
+
+def test_optimize_within_limit():
+    response = post("/prediction/optimize", {"parameters": PARAMETERS, "years": 10})
+    assert response.status_code == 200
+    assert response.json()["evaluated"] > 0
+
+
+def test_montecarlo_rejects_oversized_paths_times_points():
+    response = post("/prediction/montecarlo", {
+        "parameters": {**PARAMETERS, "horizon_years": 100, "points_per_year": 366},
+        "paths": 10000,
+    })
+    assert response.status_code == 413
+
+
+def test_montecarlo_within_limit():
+    response = post("/prediction/montecarlo", {"parameters": PARAMETERS, "paths": 1000})
+    assert response.status_code == 200
+    assert len(response.json()["cost_leasing"]) == 3
+
+
+def test_batch_rejects_oversized_parameter_sets_times_points():
+    rows = [{**PARAMETERS, "horizon_years": 100, "points_per_year": 366}] * 200
+    assert post("/prediction/batch", rows).status_code == 413
+
+
+def test_batch_within_limit():
+    response = post("/prediction/batch", [PARAMETERS] * 3)
+    assert response.status_code == 200
+
+
+def test_prediction_is_not_cached_by_shared_caches():
+    async def send():
+        async with httpx.AsyncClient(app=server.app, base_url="http://test") as client:
+            return await client.get("/prediction", params=PARAMETERS, headers=HEADERS)
+    response = asyncio.run(send())
+    assert response.status_code == 200
+    assert "public" not in response.headers["Cache-Control"]
+    assert "Authorization" in response.headers["Vary"]
@@ -0,0 +1,97 @@
+import random
+
+import numpy as np
+import pytest
+
+from core.prediction import engine
+from core.prediction.model import PredictionParameters
+
+pd = pytest.importorskip('pandas')
+
+FIELDS = (
+    'purchase_years', 'purchase_new_price', 'purchase_used_price', 'purchase_used_age',
+    'leasing_cost_per_month', 'leasing_switch_cost', 'leasing_years',
+    'repair_cost_per_year', 'repair_free_years',
+)
+
+def reference_prediction(params: PredictionParameters) -> dict:
+    """The per-row pandas implementation the engine replaced, kept as the reference of its results."""
+    params.ensure_valid()
+
+    def cost_purchase(age_month, price, initial_years):
+        years = params.purchase_years - initial_years
+        car_count = age_month // (years * 12) + 1
+        car_age_months = age_month % (years * 12)
+
+        cost_purchase = car_count * price
+
+        car_repairfree_months = max(0, params.repair_free_years - initial_years) * 12
+        repair_months = max(0, years * 12 - car_repairfree_months) * (car_count - 1)
+        repair_months += max(0, car_age_months - car_repairfree_months)
+        cost_repair  = repair_months * params.repair_cost_per_year / 12
+
+        return cost_purchase + cost_repair
+
+    def cost_leasing(age_month):
+        car_count = (age_month - 1) // (params.leasing_years * 12) + 1
+        switch_cost = car_count * params.leasing_switch_cost
+        rate_cost = age_month * params.leasing_cost_per_month
+        return switch_cost + rate_cost
+
+    df = pd.DataFrame()
+    df['year'] = range(1, 60)
+    df['year'] = df['year'] / 2
+    df['month'] = df['year'] * 12
+    df['cost_used_purchase'] = df['month'].apply(
+        lambda x: cost_purchase(x, params.purchase_used_price, params.purchase_used_age))
+    df['cost_new_purchase'] = df['month'].apply(
+        lambda x: cost_purchase(x, params.purchase_new_price, 0))
+    df['cost_leasing'] = df['month'].apply(lambda x: cost_leasing(x))
+    return {name: df[name].tolist() for name in df.columns}
+
+
+def random_parameters(rng: random.Random, as_strings: bool) -> PredictionParameters:
+    """Draw parameters beyond the ranges of the app, as query strings if requested."""
+    purchase_years = rng.randint(1, 30)
+    values = {
+        "purchase_years": purchase_years,
+        "purchase_new_price": rng.randint(1, 500000),
+        "purchase_used_price": rng.randint(1, 500000),
+        # the used car may be older than its replacement age, only equal ages cannot be computed
+        "purchase_used_age": rng.choice([age for age in range(0, 40) if age != purchase_years]),
+        "leasing_cost_per_month": rng.randint(1, 10000),
+        "leasing_switch_cost": rng.randint(1, 20000),
+        "leasing_years": rng.randint(1, 12),
+        "repair_cost_per_year": rng.randint(0, 20000),
+        "repair_free_years": rng.randint(0, 40),
+    }
+    if as_strings:
+        values = {name: str(value) for name, value in values.items()}
+    return PredictionParameters(**values)
+
+
+@pytest.mark.parametrize('as_strings', [False, True])
+def test_engine_matches_reference(as_strings):
+    rng = random.Random(1 if as_strings else 0)
+    for _ in range(500):
+        params = random_parameters(rng, as_strings)
+        expected = reference_prediction(PredictionParameters(**params.__dict__))
+        params.ensure_valid()
+        year, month = engine.time_axis()
+        costs = engine.predict(month, params.__dict__)
+
+        assert year.tolist() == expected['year']
+        assert month.tolist() == expected['month']
+        for name, cost in zip(engine.CURVE_FIELDS, costs):
+            # bit-identical, not merely close
+            assert cost.tolist() == expected[name], (name, params)
+
+
+def test_engine_matches_reference_errors():
+    params = random_parameters(random.Random(2), True)
+    params.purchase_used_age = params.purchase_years
+    with pytest.raises(ZeroDivisionError):
+        reference_prediction(PredictionParameters(**params.__dict__))
+    params.ensure_valid()
+    with pytest.raises(ZeroDivisionError):
+        engine.predict(engine.time_axis()[1], params.__dict__)
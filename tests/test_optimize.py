@@ -0,0 +1,47 @@
+import random
+
+import numpy as np
+import pytest
+
+from core.prediction import engine, optimize
+
+def exhaustive(fixed: dict, ranges: dict, years: float) -> list:
+    """The cost per month of every valid configuration of every strategy, without pruning."""
+    values = optimize.create_search_values(optimize.create_search_ranges(ranges))
+    month = np.float64(years * 12)
+    costs = []
+    for strategy in optimize.SEARCH_FIELDS:
+        columns = optimize.search_grid(strategy, values)
+        cost = engine.predict_curve(strategy, month, {**fixed, **columns})
+        costs.append((strategy, cost / month))
+    return costs
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_pruned_search_matches_exhaustive_search(seed):
+    rng = random.Random(seed)
+    fixed = {
+        "purchase_new_price": rng.randint(1, 100000),
+        "purchase_used_price": rng.randint(1, 100000),
+        "leasing_cost_per_month": rng.randint(1, 2000),
+        "leasing_switch_cost": rng.randint(1, 20000),
+        "repair_cost_per_year": rng.randint(0, 5000),
+        "repair_free_years": rng.randint(0, 10),
+    }
+    ranges = {
+        "purchase_years": {"start": rng.randint(1, 5), "stop": rng.randint(6, 15)},
+        "purchase_used_age": {"start": 0, "stop": rng.randint(1, 8)},
+        "leasing_years": {"start": 1, "stop": rng.randint(2, 8)},
+    }
+    # horizons of less than a month, between whole periods and at multiples of a year
+    years = rng.choice([1 / 24, 1 / 12, 0.5, rng.uniform(0.01, 30), float(rng.randint(1, 30))])
+    top = rng.randint(0, 10)
+
+    result = optimize.optimize(fixed, ranges, years, top, block_size=rng.choice([1, 4, 4096]))
+    costs = exhaustive(fixed, ranges, years)
+
+    for strategy, per_month in costs:
+        assert result.best[strategy].cost_per_month == per_month.min()
+    expected = np.sort(np.concatenate([per_month for _, per_month in costs]))[:top]
+    assert [candidate.cost_per_month for candidate in result.top] == expected.tolist()
+    assert result.evaluated + result.pruned == sum(per_month.size for _, per_month in costs)
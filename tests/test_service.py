@@ -0,0 +1,118 @@
+import random
+
+import numpy as np
+import pytest
+
+from core.prediction import engine, ledger, montecarlo, service
+from core.prediction.model import PredictionParameters
+
+def random_parameters(rng: random.Random) -> dict:
+    """Draw valid parameters whose used car is younger than its replacement age."""
+    purchase_years = rng.randint(1, 30)
+    return {
+        "purchase_years": purchase_years,
+        "purchase_new_price": rng.randint(1, 500000),
+        "purchase_used_price": rng.randint(1, 500000),
+        "purchase_used_age": rng.randint(0, purchase_years - 1),
+        "leasing_cost_per_month": rng.randint(1, 10000),
+        "leasing_switch_cost": rng.randint(1, 20000),
+        "leasing_years": rng.randint(1, 12),
+        "repair_cost_per_year": rng.randint(0, 20000),
+        "repair_free_years": rng.randint(0, 40),
+        "horizon_years": rng.choice([2, 10, 30, 50]),
+        "points_per_year": rng.choice([1, 2, 12, 365]),
+    }
+
+
+class DictCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, value):
+        self.entries[key] = value
+
+
+def test_single_predictions_match_batches():
+    rng = random.Random(3)
+    cache = DictCache()
+    for _ in range(300):
+        params = random_parameters(rng)
+        single = service.create_prediction_arrays(PredictionParameters(**params))
+        curves, _ = service.create_prediction_curves(PredictionParameters(**params), cache)
+        batch = service.create_prediction_batch(service.create_parameter_columns([params]))
+        for name in engine.CURVE_FIELDS:
+            # bit-identical, not merely close
+            assert getattr(single, name).tolist() == getattr(batch, name)[0].tolist(), (name, params)
+            assert getattr(curves, name).tolist() == getattr(batch, name)[0].tolist(), (name, params)
+
+
+def test_ledger_matches_closed_form():
+    rng = random.Random(4)
+    for _ in range(300):
+        params = random_parameters(rng)
+        month = engine.time_axis(params['horizon_years'], params['points_per_year'])[1]
+        for name, cost in zip(engine.CURVE_FIELDS, engine.predict(month, params)):
+            np.testing.assert_allclose(ledger.predict_curve(name, month, params), cost, rtol=1e-12)
+
+
+def test_discounting_lowers_future_costs():
+    params = random_parameters(random.Random(5))
+    nominal = service.create_prediction_arrays(PredictionParameters(**params))
+    discounted = service.create_prediction_arrays(PredictionParameters(**params), 0.05)
+    for name in engine.CURVE_FIELDS:
+        assert np.all(getattr(discounted, name) <= getattr(nominal, name) * (1 + 1e-12))
+        assert getattr(discounted, name)[-1] < getattr(nominal, name)[-1]
+
+
+@pytest.mark.parametrize("block_cells", [1, 1000, 2000000])
+def test_simulation_does_not_depend_on_blocks(block_cells):
+    params = PredictionParameters(**random_parameters(random.Random(3)))
+    expected = montecarlo.simulate(params, montecarlo.DEFAULT_DISTRIBUTIONS, 3000, seed=5, block_cells=10**9)
+    result = montecarlo.simulate(params, montecarlo.DEFAULT_DISTRIBUTIONS, 3000, seed=5, block_cells=block_cells)
+    for name in engine.CURVE_FIELDS:
+        np.testing.assert_array_equal(getattr(result, name), getattr(expected, name))
+
+
+REPORTED_BREAKEVEN = {
+    "purchase_years": 11, "purchase_new_price": 76999, "purchase_used_price": 28491, "purchase_used_age": 2,
+    "leasing_cost_per_month": 698, "leasing_switch_cost": 1856, "leasing_years": 4,
+    "repair_cost_per_year": 4141, "repair_free_years": 6,
+}
+
+@pytest.mark.parametrize("seed", [None] + list(range(100)))
+def test_breakeven_matches_dense_sampling(seed):
+    values = REPORTED_BREAKEVEN if seed is None else random_parameters(random.Random(seed))
+    params = PredictionParameters(**{**values, "horizon_years": 30, "points_per_year": 2})
+    crossovers = service.create_breakeven(params)
+    horizon = engine.time_axis(params.horizon_years, params.points_per_year)[1][-1]
+    month = np.linspace(0.0, horizon, 20001)[1:]
+    costs = dict(zip(engine.CURVE_FIELDS, engine.predict(month, params.__dict__)))
+
+    for first, second in [
+        ('cost_used_purchase', 'cost_new_purchase'),
+        ('cost_used_purchase', 'cost_leasing'),
+        ('cost_new_purchase', 'cost_leasing'),
+    ]:
+        pair = [crossover for crossover in crossovers if crossover.strategies == [first, second]]
+        times = [crossover.month for crossover in pair]
+        assert times == sorted(set(times)), "crossovers of a pair must be at distinct times"
+        assert all(a.cheaper != b.cheaper for a, b in zip(pair, pair[1:]))
+
+        # the cheaper strategy between the crossovers agrees with the sampled costs
+        sign = np.sign(costs[first] - costs[second])
+        index = np.searchsorted(times, month, side='right')
+        near = np.zeros(month.size, dtype=bool)
+        for time in times:
+            near |= np.abs(month - time) < 1e-6 * max(1.0, time)
+        sampled = (sign != 0) & ~near
+        if not pair:
+            assert np.unique(sign[sampled]).size <= 1
+            continue
+        cheaper = np.array([second if crossover.cheaper == second else first for crossover in pair])
+        initial = first if pair[0].cheaper == second else second
+        expected = np.where(index == 0, initial, cheaper[np.maximum(index - 1, 0)])
+        actual = np.where(sign > 0, second, first)
+        np.testing.assert_array_equal(actual[sampled], expected[sampled])